@@ -0,0 +1,68 @@
+import concurrent.futures
+import numpy
+
+# Vectorized bootstrap. A whole set of B replicates is drawn at once as a (B x n) matrix
+# of indices into the sample, and the statistic is reduced along axis 1. Large problems
+# are split in chunks of at most 'chunk' elements to keep memory bounded.
+
+statistics = {
+    "median": numpy.median,
+    "mean": numpy.mean,
+    "min": numpy.min,
+    "max": numpy.max,
+}
+
+chunk = 2**24
+
+def replicates(samples, B, rng, statistic="median"):
+    """B bootstrap replicates of a statistic of a 1D sample. With a tuple of statistics,
+    a (len(statistic) x B) array of all of them, computed on the same resamples"""
+    samples = numpy.asarray(samples, dtype=numpy.float64)
+    stats = [statistics[s] for s in ((statistic,) if isinstance(statistic, str) else statistic)]
+    n = len(samples)
+    out = numpy.empty((len(stats), B))
+    step = max(1, chunk // max(n, 1))
+    for b in range(0, B, step):
+        resamples = samples[rng.integers(0, n, size=(min(step, B - b), n))]
+        for i, stat in enumerate(stats):
+            out[i, b:b+step] = stat(resamples, axis=1)
+    return out[0] if isinstance(statistic, str) else out
+
+def interval(reps, confidence=0.95):
+    """Percentile confidence interval of a set of replicates (along the last axis)"""
+    alpha = (1 - confidence) / 2
+    return numpy.quantile(reps, [alpha, 1 - alpha], axis=-1)
+
+def ratio_ci(numerators, groups, B=10000, confidence=0.95, numerator_statistic="median",
+             statistic="median", seed=None, jobs=None):
+    """Bootstrap confidence intervals of statistic(numerator) / statistic(sample).
+
+    'numerators' maps a key to a sample (e.g. the baseline runs) and 'groups' maps a
+    key to a pair (numerator key, sample). The numerator replicates are drawn once and
+    shared by all the groups referring to them, so each interval accounts for the
+    uncertainty of both the numerator and the group. A group whose sample is None is
+    the numerator sample itself (e.g. the baseline thread count of a self-speedup): its
+    replicates are both statistics of the same resamples, rather than of two independent
+    ones. Groups are resampled in parallel. Returns {key: (lower, upper)}."""
+    seeds = numpy.random.SeedSequence(seed).spawn(len(numerators) + len(groups))
+    rngs = [numpy.random.default_rng(s) for s in seeds]
+
+    itself = {num_key for num_key, samples in groups.values() if samples is None}
+    num_reps, self_reps = {}, {}
+    for i, (k, v) in enumerate(numerators.items()):
+        if k in itself:
+            num_reps[k], reps = replicates(v, B, rngs[i], (numerator_statistic, statistic))
+            self_reps[k] = num_reps[k] / reps
+        else:
+            num_reps[k] = replicates(v, B, rngs[i], numerator_statistic)
+
+    def task(i, num_key, samples):
+        if samples is None:
+            return interval(self_reps[num_key], confidence)
+        reps = num_reps[num_key] / replicates(samples, B, rngs[len(numerators) + i], statistic)
+        return interval(reps, confidence)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as pool:
+        futures = {key: pool.submit(task, i, num_key, samples)
+                   for i, (key, (num_key, samples)) in enumerate(groups.items())}
+        return {key: tuple(f.result()) for key, f in futures.items()}
@@ -1,5 +1,12 @@
 import matplotlib.gridspec as gridspec
 import matplotlib.pyplot as plt
+import concurrent.futures
+import itertools
+import topology
+import distfit
+import drift
+import kde
+import argparse
 import pandas
 import numpy
 import sys
@@ -9,153 +16,241 @@ from scipy.stats import zscore
 from scipy.stats import lognorm
 from scipy.stats import exponweib
 import scipy.stats
-import seaborn as sns
 
-N = len(sys.argv[1:])
+# Hartigan's dip test of unimodality (optional)
+try:
+    import diptest
+except ImportError:
+    diptest = None
+
+# The statistics of every CPU (summary, quantiles, tail ratios, Gaussian mixture and
+# lognormal fits, KDE) are computed by analyze() in a pool of processes, one task per
+# file. The workers return plain numbers and curves, collected in a single DataFrame,
+# and all the plotting happens at the end in the main process.
+
 f_mad = lambda x: (x - x.median()).abs().median()
 
-ncores = N
-nrows = 2
-ncols = ncores // 2
-fig = plt.figure(constrained_layout=True)
-fig.set_size_inches(22, 10)
-gs = gridspec.GridSpec(nrows, ncols, figure=fig)
-axes = []
-
-left_lim = None
-right_lim = None
-
-
-for col in range(ncols):
-    for row in range(nrows):
-        axes.append(fig.add_subplot(gs[row, col]))
-        
-
-all_times = []
-times_sock = [numpy.array([], dtype=numpy.float64), numpy.array([], dtype=numpy.float64)]
-for i, arg in enumerate(sys.argv[1:]):
-    ax = axes[i % ncores]
-    df = pandas.read_csv(arg)
-    times = df["time"]
-    times_sock[i%2] = numpy.concatenate((times_sock[i%2], times.values))
-
-    def sigma_interval(x, n):
-        p = norm.cdf(n)
-        return zscore(x).quantile(1-p), zscore(x).quantile(p)
-        
-    print(arg)
-    padding = 15
-    print("\t{:{padding}}{:.3f}".format("median", times.median(), padding=padding))
-    print("\t{:{padding}}{:.3f}".format("min", times.min(), padding=padding))
-    print("\t{:{padding}}{:.3f}".format("mean", times.mean(), padding=padding))
-    print("\t{:{padding}}{:.3f}".format("std", times.std(), padding=padding))
-    print("\t{:{padding}}{:.3f}".format("MAD", f_mad(times), padding=padding))
-    print("\t{:{padding}}[{:.2f}; {:.2f}]".format("Q-Q [-1;1]", *sigma_interval(times, 1), padding=padding))
-    print("\t{:{padding}}[{:.2f}; {:.2f}]".format("Q-Q [-2;2]", *sigma_interval(times, 2), padding=padding))
-    print("\t{:{padding}}[{:.2f}; {:.2f}]".format("Q-Q [-3;3]", *sigma_interval(times, 3), padding=padding))
-    print()
- 
+quantiles = [0.5, 0.9, 0.95, 0.99, 0.999]
+
+def sigma_interval(x, n):
+    p = norm.cdf(n)
+    z = pandas.Series(zscore(x))
+    return z.quantile(1-p), z.quantile(p)
+
+def analyze(filename, cpu, bw="scott"):
+    """Worker: statistics and fitted curves of the times of a single CPU.
+    Returns a row of statistics, the curves to plot and the raw times"""
+    times = pandas.read_csv(filename)["time"].astype(numpy.float64)
+
     # l = times.quantile(0.00)
     # r = times.quantile(1.00)
     # l = times.median() - 7 * f_mad(times)
     # r = times.median() + 20 * f_mad(times)
     l = times.mean() - 1 * times.std()
     r = times.mean() + 8 * times.std()
-    left_lim = left_lim or l
-    right_lim = right_lim or l
-    left_lim = min(left_lim, l)
-    right_lim = max(right_lim, r)
-
-    if row == 0:
-        ax.tick_params(bottom=False, labelbottom=False)
-    # sns.kdeplot(times, fill=True, ax=ax, label=f"core {i}, socket {i%2}")
-    times_trimmed = times
-    times_trimmed = times_trimmed[times_trimmed >= l]
-    times_trimmed = times_trimmed[times_trimmed <= r]
-    if N <= 16:
-        ax.text(
-            0.95, 0.95, 
-            #i,
-            "core {}\nmedian = {:.0f}\nstd = {:.2f}\nMAD = {:.2f}".format(
-                i, times.median(), times.std(), f_mad(times)),
-            fontsize=10,
-            va="top", ha="right", 
-            transform=ax.transAxes 
-        )
+    times_trimmed = times[(times >= l) & (times <= r)]
 
-    ax.tick_params(left=False, labelleft=False)
+    row = {
+        "file": filename, "cpu": cpu, "runs": len(times),
+        "median": times.median(), "min": times.min(), "mean": times.mean(),
+        "std": times.std(), "mad": f_mad(times), "trim_left": l, "trim_right": r,
+    }
+    for n in (1, 2, 3):
+        row[f"qq{n}_low"], row[f"qq{n}_high"] = sigma_interval(times, n)
+    for q, v in zip(quantiles, times.quantile(quantiles)):
+        row[f"q{q*100:g}"] = v
+    # how far the tail goes, relative to the median
+    row["tail_p99"] = row["q99"] / row["median"]
+    row["tail_p99.9"] = row["q99.9"] / row["median"]
+    row["trimmed_q2sigma"] = times_trimmed.quantile(norm.cdf(2))
 
-    sns.kdeplot(times_trimmed, fill=True, ax=ax, clip=(l, r), bw_adjust=0.4,
-                color="mediumpurple", edgecolor="none")
+    x = numpy.linspace(min(times_trimmed), max(times_trimmed), 500)
 
-    ymin, ymax = ax.get_ylim()
-    ymax *= 0.75
-    # ax.vlines(x=times.quantile(0.9), ymin=ymin, ymax=ymax, color="purple", linewidth=2)
-    # ax.vlines(x=times.quantile(0.95), ymin=ymin, ymax=ymax, color="purple", linewidth=2)
-    # ax.vlines(x=times.quantile(0.99), ymin=ymin, ymax=ymax, color="purple", linewidth=2)
-    # ax.vlines(x=times.quantile(norm.cdf(1)), ymin=ymin, ymax=ymax, color="purple", linewidth=2)
-    # ax.vlines(x=times.quantile(norm.cdf(2)), ymin=ymin, ymax=ymax, color="purple", linewidth=2)
-    # ax.vlines(x=times.quantile(norm.cdf(3)), ymin=ymin, ymax=ymax, color="purple", linewidth=2)
+    gmm = GaussianMixture(n_components=2).fit(times_trimmed.to_numpy().reshape(-1, 1))
+    order = numpy.argsort(gmm.means_.ravel())
+    for k, c in enumerate(order):
+        row[f"gmm{k}_weight"] = gmm.weights_[c]
+        row[f"gmm{k}_mean"] = gmm.means_[c, 0]
+        row[f"gmm{k}_std"] = numpy.sqrt(gmm.covariances_.ravel()[c])
+
+    s, loc, scale = scipy.stats.lognorm.fit(times_trimmed)
+    row["lognorm_s"], row["lognorm_loc"], row["lognorm_scale"] = s, loc, scale
+    row["lognorm_q2sigma"] = scipy.stats.lognorm.ppf(norm.cdf(2), s, loc, scale)
 
-    # ax.vlines(x=times.mean()+1*times.std(), ymin=ymin, ymax=ymax, color="orange", linewidth=2, linestyle="--")
-    ax.vlines(x=times.mean()+2*times.std(), ymin=ymin, ymax=ymax, color="red", linewidth=1.5, linestyle="--")
-    # ax.vlines(x=times.mean()+3*times.std(), ymin=ymin, ymax=ymax, color="orange", linewidth=2, linestyle="--")
+    curves = {
+        "x": x,
+        "kde": kde.density(times_trimmed.to_numpy(), x, bw, bw_adjust=0.4)[1],
+        "gmm": numpy.exp(gmm.score_samples(x.reshape(-1, 1))),
+        "lognorm": scipy.stats.lognorm.pdf(x, s, loc, scale),
+    }
+    return row, curves, times.to_numpy()
 
-    # ax.vlines(x=times_trimmed.mean()+1*times_trimmed.std(), ymin=ymin, ymax=ymax, color="grey", linewidth=1, linestyle="--")
-    # ax.vlines(x=times_trimmed.mean()+2*times_trimmed.std(), ymin=ymin, ymax=ymax, color="grey", linewidth=1, linestyle="--")
-    # ax.vlines(x=times_trimmed.mean()+3*times_trimmed.std(), ymin=ymin, ymax=ymax, color="grey", linewidth=1, linestyle="--")
+# ===== NOISE REPORT ====================================================================
+#
+# Headless classification of the noise of every CPU:
+# - spike rate: fraction of the runs slower than median + k robust standard deviations
+#   (1.4826 MAD), i.e. the interruptions of OS jitter
+# - bimodality: BIC of a 1-component Gaussian mixture minus the BIC of a 2-component
+#   one (above 10 is strong evidence of two modes) and Hartigan's dip test
+# - tail heaviness: distance from the median to the 99th percentile in robust standard
+#   deviations (2.33 for a normal distribution) and p99 / median
+# The mixtures and the dip test use a random subsample of at most 'max_fit' runs. The
+# noise index is the mean of the percentile ranks of the spike rate, the relative MAD,
+# the tail ratio and the BIC gain among all the CPUs: 0 for the quietest, 1 for the
+# noisiest.
 
-    # ax.vlines(x=times.median()+1*1.5*f_mad(times), ymin=ymin, ymax=ymax, color="orange", linewidth=2, linestyle="--")
-    # ax.vlines(x=times.median()+2*1.5*f_mad(times), ymin=ymin, ymax=ymax, color="orange", linewidth=2, linestyle="--")
-    # ax.vlines(x=times.median()+3*1.5*f_mad(times), ymin=ymin, ymax=ymax, color="orange", linewidth=2, linestyle="--")
+def classify(filename, cpu, spike_threshold=3.5, max_fit=20000, seed=0):
+    """Worker: noise statistics of the times of a single CPU"""
+    times = pandas.read_csv(filename)["time"].to_numpy(dtype=numpy.float64)
+    q1, q50, q99 = numpy.quantile(times, [0.01, 0.5, 0.99])
+    sigma = 1.4826 * numpy.median(numpy.abs(times - q50))
 
-    # ax.vlines(x=times_trimmed.quantile(norm.cdf(1)), ymin=ymin, ymax=ymax, color="grey", linewidth=2)
-    ax.vlines(x=times_trimmed.quantile(norm.cdf(2)), ymin=ymin, ymax=ymax, color="purple", linewidth=2.5)
-    # ax.vlines(x=times_trimmed.quantile(norm.cdf(3)), ymin=ymin, ymax=ymax, color="grey", linewidth=2)
-    # ax.vlines(x=times.mean()+2*times.std(), ymin=ymin, ymax=ymax, color="red", linewidth=2, linestyle="--")
-    # ax.vlines(x=times_trimmed.mean()+2*times_trimmed.std(), ymin=ymin, ymax=ymax, color="orange", linewidth=2, linestyle="--")
-    # ax.vlines(x=times.mean()+2*times.std(), ymin=ymin, ymax=ymax, color="orange", linewidth=2, linestyle="--")
-    # ax.vlines(x=times.mean()+3*times.std(), ymin=ymin, ymax=ymax, color="orange", linewidth=2, linestyle="--")
+    rng = numpy.random.default_rng(seed)
+    sample = times if len(times) <= max_fit else rng.choice(times, max_fit, replace=False)
+    sample = sample.reshape(-1, 1)
+    bic = [GaussianMixture(n_components=k, random_state=seed).fit(sample).bic(sample)
+           for k in (1, 2)]
+    dip, dip_p = numpy.nan, numpy.nan
+    if diptest is not None:
+        dip, dip_p = diptest.diptest(sample.ravel())
 
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        return {
+            "file": filename, "cpu": cpu, "runs": len(times),
+            "median": q50, "mad": sigma / 1.4826, "rel_mad": sigma / 1.4826 / q50,
+            "spike_rate": numpy.mean(times > q50 + spike_threshold * sigma),
+            "bic_gain": bic[0] - bic[1],
+            "dip": dip, "dip_p": dip_p,
+            "tail_ratio": (q99 - q50) / sigma,
+            "tail_p99": q99 / q50,
+        }
 
-    x = numpy.linspace(min(times_trimmed), max(times_trimmed), 500)
+def noise_report(rows, alpha=0.05, spike_rate=0.01, tail_ratio=5.0):
+    """Noise index and labels ('spiky', 'bimodal', 'heavy-tail' or 'quiet') of the
+    rows returned by classify()"""
+    report = pandas.DataFrame(rows)
+    ranks = report[["spike_rate", "rel_mad", "tail_ratio", "bic_gain"]].rank(pct=True)
+    report["noise_index"] = ranks.mean(axis=1) if len(report) > 1 else 0.0
+    bimodal = report["bic_gain"] > 10
+    if report["dip_p"].notna().any():
+        bimodal &= report["dip_p"] < alpha
+    labels = pandas.DataFrame({
+        "spiky": report["spike_rate"] > spike_rate,
+        "bimodal": bimodal,
+        "heavy-tail": report["tail_ratio"] > tail_ratio,
+    })
+    report["label"] = labels.apply(lambda r: "+".join(labels.columns[r.to_numpy()]) or "quiet",
+                                   axis=1)
+    return report
 
-    gmm = GaussianMixture(n_components=2).fit(times_trimmed.to_numpy().reshape(-1, 1))
-    pdf = numpy.exp(gmm.score_samples(x.reshape(-1, 1)))
-    ax.plot(x, pdf, color="purple", linewidth=1.5)
+def plot_heatmap(report, filename):
+    """Noise index of every CPU, with one row per socket and SMT thread and one column
+    per core"""
+    grid = report.pivot_table(index=["package", "smt"], columns="core", values="noise_index")
+    fig, ax = plt.subplots(constrained_layout=True)
+    fig.set_size_inches(min(max(4, 0.35 * grid.shape[1] + 2), 40),
+                        min(max(2, 0.5 * grid.shape[0] + 1.5), 20))
+    image = ax.imshow(grid.to_numpy(), cmap="magma_r", vmin=0, vmax=1, aspect="auto")
+    ax.set_xticks(range(grid.shape[1]), grid.columns, fontsize="small",
+                  rotation="vertical")
+    ax.set_yticks(range(grid.shape[0]),
+                  [f"socket {p}, SMT {t}" for p, t in grid.index], fontsize="small")
+    ax.set_xlabel("Core")
+    fig.colorbar(image, ax=ax, label="Noise index (0 = quietest)")
+    fig.savefig(filename)
+    plt.close(fig)
 
-    s, loc, scale = scipy.stats.lognorm.fit(times_trimmed)
-    pdf = scipy.stats.lognorm.pdf(x, s, loc, scale)
-    ax.plot(x, pdf, color="orange", linewidth=1.5)
-    ax.vlines(x=scipy.stats.lognorm.ppf(norm.cdf(2), s, loc, scale), ymin=ymin, ymax=ymax, color="orange", linewidth=1.5, linestyle="--")
+# ===== DISTRIBUTION FITS ===============================================================
+# Headless model selection: distfit fits every family to the times of each CPU (in the
+# pool, the fits are cached by data hash) and ranks them by AIC, BIC and KS distance.
 
-    # alpha, beta, loc, scale = scipy.stats.beta.fit(times_trimmed, floc=l, fscale=r-l)
-    # pdf = scipy.stats.beta.pdf(x, alpha, beta, loc, scale)
-    # ax.plot(x, pdf, label="Beta", color="#f0f")
-    # ax.vlines(x=scipy.stats.beta.ppf(norm.cdf(s), alpha, beta, loc, scale), ymin=ymin, ymax=ymax, color="#f0f", linewidth=2)
+def fit_times(filename, cpu, families=distfit.families):
+    """Worker: ranked distribution fits of the times of a single CPU"""
+    times = pandas.read_csv(filename)["time"].to_numpy(dtype=numpy.float64)
+    fits = distfit.fit(times, families)
+    fits.insert(0, "cpu", cpu)
+    fits.insert(0, "file", filename)
+    return fits
 
-    # a, c, loc, scale = scipy.stats.exponweib.fit(times_trimmed)
-    # pdf = scipy.stats.exponweib.pdf(x, a, c, loc, scale)
-    # ax.plot(x, pdf, label="Exponetiated Weibull", color="#f0f")
-    # ax.vlines(x=scipy.stats.exponweib.ppf(norm.cdf(s), a, c, loc, scale), ymin=ymin, ymax=ymax, color="#f0f", linewidth=2)
-    
-    # loc, scale = times_trimmed.median(), 1.48*f_mad(times_trimmed)
-    # pdf = scipy.stats.norm.pdf(x, loc, scale)
-    # ax.plot(x, pdf, label="Gaussian", color="#00e")
-    # ax.vlines(x=scipy.stats.norm.ppf(norm.cdf(s), loc, scale), ymin=ymin, ymax=ymax, color="#00e", linewidth=2)
-    
+# ===== RUN-ORDER DRIFT =================================================================
+# Headless time-series view of the same files: the runs are taken in the order they
+# were measured, to find warm-up and drift (thermal throttling, frequency ramps) that
+# the distributions above hide. See drift.py.
 
-    # ax.vlines(x=times_trimmed.quantile(norm.cdf(s)), ymin=ymin, ymax=ymax, color="grey", linewidth=2, linestyle="--")
-    # ax.vlines(x=min(times), ymin=ymin, ymax=ymax, color="grey", linewidth=2, linestyle="--")
-    # ax.legend(loc="upper left")
+def drift_times(filename, cpu, window=25, tolerance=0.01):
+    """Worker: drift report, segments and rolling median of the times of a single CPU"""
+    times = pandas.read_csv(filename)["time"].to_numpy(dtype=numpy.float64)
+    report, segs, smooth = drift.analyze(times, window, tolerance)
+    return {"file": filename, "cpu": cpu, **report}, segs, smooth, times
 
-# for ax in axes:
-#     ax.set_xlim(left=left_lim, right=right_lim)
+def plot_drift(results, filename):
+    """Runs in measurement order of every CPU, with their rolling median, the medians
+    of the segments between change points and the warm-up shaded"""
+    N = len(results)
+    ncols = min(N, 4)
+    nrows = (N + ncols - 1) // ncols
+    fig, axs = plt.subplots(nrows, ncols, squeeze=False, sharex=True, constrained_layout=True)
+    fig.set_size_inches(4 * ncols, 2.5 * nrows)
+    for ax, (row, segs, smooth, times) in zip(axs.flat, results):
+        runs = numpy.arange(len(times))
+        ax.plot(runs, times, ".", color="#999999", markersize=1.5)
+        ax.plot(runs, smooth, color="#5588dd", linewidth=1)
+        ax.hlines(segs["median"], segs["start"], segs["end"], color="#882255", linewidth=1.5)
+        if row["warmup"]:
+            ax.axvspan(0, row["warmup"], color="#ddcc77", alpha=0.4, linewidth=0)
+        lo, hi = numpy.quantile(times, [0.001, 0.99])
+        ax.set_ylim(lo - 0.1 * (hi - lo), hi + 0.1 * (hi - lo))
+        ax.set_title("CPU {} ({} warm-up runs)".format(row["cpu"], row["warmup"]),
+                     fontsize="small")
+    for ax in list(axs.flat)[N:]:
+        ax.set_visible(False)
+    for ax in axs[-1]:
+        ax.set_xlabel("Run")
+    fig.savefig(filename)
+    plt.close(fig)
 
-plt.show()
+def print_stats(row):
+    padding = 15
+    print("\t{:{padding}}{:.3f}".format("median", row["median"], padding=padding))
+    print("\t{:{padding}}{:.3f}".format("min", row["min"], padding=padding))
+    print("\t{:{padding}}{:.3f}".format("mean", row["mean"], padding=padding))
+    print("\t{:{padding}}{:.3f}".format("std", row["std"], padding=padding))
+    print("\t{:{padding}}{:.3f}".format("MAD", row["mad"], padding=padding))
+    for n in (1, 2, 3):
+        print("\t{:{padding}}[{:.2f}; {:.2f}]".format(
+            f"Q-Q [-{n};{n}]", row[f"qq{n}_low"], row[f"qq{n}_high"], padding=padding))
+    print("\t{:{padding}}{:.3f}".format("p99 / median", row["tail_p99"], padding=padding))
+    print()
 
-def trim2(y):
-    return pandas.Series(y)
+def plot_cpu(ax, row, curves, topo, label=True):
+    x = curves["x"]
+    if label:
+        ax.text(
+            0.95, 0.95,
+            "CPU {}, socket {}, node {}\nmedian = {:.0f}\nstd = {:.2f}\nMAD = {:.2f}".format(
+                row["cpu"], topo.loc[row["cpu"], "package"], topo.loc[row["cpu"], "node"],
+                row["median"], row["std"], row["mad"]),
+            fontsize=10,
+            va="top", ha="right",
+            transform=ax.transAxes
+        )
+
+    ax.tick_params(left=False, labelleft=False)
+
+    ax.fill_between(x, curves["kde"], color="mediumpurple", edgecolor="none", alpha=0.5)
+    ax.set_ylim(bottom=0)
+
+    ymin, ymax = ax.get_ylim()
+    ymax *= 0.75
+    # ax.vlines(x=times.quantile(0.9), ymin=ymin, ymax=ymax, color="purple", linewidth=2)
+    # ax.vlines(x=times.quantile(0.95), ymin=ymin, ymax=ymax, color="purple", linewidth=2)
+    # ax.vlines(x=times.quantile(0.99), ymin=ymin, ymax=ymax, color="purple", linewidth=2)
+    ax.vlines(x=row["mean"]+2*row["std"], ymin=ymin, ymax=ymax, color="red", linewidth=1.5, linestyle="--")
+    ax.vlines(x=row["trimmed_q2sigma"], ymin=ymin, ymax=ymax, color="purple", linewidth=2.5)
+
+    ax.plot(x, curves["gmm"], color="purple", linewidth=1.5)
+    ax.plot(x, curves["lognorm"], color="orange", linewidth=1.5)
+    ax.vlines(x=row["lognorm_q2sigma"], ymin=ymin, ymax=ymax, color="orange", linewidth=1.5, linestyle="--")
 
 def trim(y, kl = 1, kr = 6):
     y = pandas.Series(y)
@@ -169,11 +264,13 @@ def trim2(y, kl = 5, kr = 15):
     a = f_mad(y)
     return y[(y >= (m-kl*a)) & (y <= (m+kr*a))]
 
-def plot_fit(data, ax):
+def plot_fit(data, ax, bw="scott"):
     data = pandas.Series(data)
     y = data
     y = trim(y, 1, 8)
-    sns.kdeplot(y, fill=True, bw_adjust=0.5, color="mediumpurple", edgecolor="none", ax=ax)
+    grid, d = kde.density(y.to_numpy(), bw=bw, bw_adjust=0.5)
+    ax.fill_between(grid, d, color="mediumpurple", edgecolor="none", alpha=0.5)
+    ax.set_ylim(bottom=0)
     x = numpy.linspace(min(y), max(y), 500)
     gmm = GaussianMixture(n_components=2).fit(y.to_numpy().reshape(-1, 1))
     pdf = numpy.exp(gmm.score_samples(x.reshape(-1, 1)))
@@ -197,11 +294,214 @@ def plot_fit(data, ax):
     ax.vlines(x=y.mean()+norm.ppf(pp)*1.4826*f_mad(y), ymin=ymin, ymax=ymax, color="blue", linewidth=1.5, linestyle="--")
     # ax.vlines(x=scale*numpy.exp(s*norm.ppf(pp))+loc, ymin=ymin, ymax=ymax, color="red", linewidth=5, linestyle="-")
 
-fig = plt.figure(constrained_layout=True)
-fig.set_size_inches(22, 10)
-gs = gridspec.GridSpec(1, 2, figure=fig)
-ax_left = fig.add_subplot(gs[0, 0])
-ax_right = fig.add_subplot(gs[0, 1])
-plot_fit(times_sock[0], ax_left)
-plot_fit(times_sock[1], ax_right)
-plt.show()
+def make_parser():
+    parser = argparse.ArgumentParser(description=
+        "Distribution of the execution times measured on each CPU (one CSV file with a "
+        "'time' column per CPU), aggregated per socket, NUMA node or SMT core.")
+
+    parser.add_argument("filenames", metavar="FILENAMES", type=str, nargs="+",
+        help="One CSV file per CPU")
+
+    parser.add_argument("--cpus", type=str, default=None,
+        help="CPUs of the files in the same order, as a CPU list (e.g. 0-63,128-191). "
+             "Default is 0, 1, 2...")
+
+    parser.add_argument("--by", type=str, choices=["socket", "node", "smt"], default="socket",
+        help="Aggregate the CPUs of each socket, NUMA node or physical core (SMT "
+             "siblings). Default is 'socket'")
+
+    parser.add_argument("--topology", metavar="DIR", type=str, default=topology.root,
+        help="Directory with the topology of the machine the times were measured on. "
+             f"Default is '{topology.root}'")
+
+    parser.add_argument("--bw", type=str, choices=sorted(kde.bandwidths), default="scott",
+        help="Bandwidth rule of the density estimates. 'isj' (Improved Sheather-Jones) "
+             "resolves multimodal distributions better. Default is 'scott'")
+
+    parser.add_argument("-j", "--jobs", metavar="NUM", type=int, default=None,
+        help="Number of worker processes. Default is the number of cores")
+
+    parser.add_argument("--stats", metavar="FILENAME", type=str, default=None,
+        help="Save the statistics of every CPU to a CSV file")
+
+    parser.add_argument("--noise", metavar="FILENAME", type=str, default=None,
+        help="Headless mode: classify the noise of every CPU (spike rate, bimodality, "
+             "tail heaviness), save the per-CPU noise index to a CSV file and print "
+             "the quietest CPUs. No plot is shown")
+
+    parser.add_argument("--heatmap", metavar="FILENAME", type=str, default=None,
+        help="Headless mode: save a heatmap of the noise index of every core to a file")
+
+    parser.add_argument("--spike-threshold", metavar="K", type=float, default=3.5,
+        help="Runs slower than median + K robust standard deviations are spikes. "
+             "Default is 3.5")
+
+    parser.add_argument("--fit", metavar="FILENAME", type=str, default=None,
+        help="Headless mode: fit the distribution families of --families to the times "
+             "of every CPU, save the fits ranked by AIC, BIC and KS distance with their "
+             "p95 and p99 to a CSV file and print the best fit of every CPU")
+
+    parser.add_argument("--families", type=str, default=",".join(distfit.families),
+        help="Comma-separated families to fit. Default is '{}'".format(
+             ",".join(distfit.families)))
+
+    parser.add_argument("--criterion", type=str, choices=["aic", "bic", "ks"], default="bic",
+        help="Criterion selecting the best fit with --fit. Default is 'bic'")
+
+    parser.add_argument("--drift", metavar="FILENAME", type=str, default=None,
+        help="Headless mode: analyze the times of every CPU in run order (change points, "
+             "warm-up, drift, autocorrelation), save the report to a CSV file and print "
+             "how many warm-up runs to discard")
+
+    parser.add_argument("--drift-plot", metavar="FILENAME", type=str, default=None,
+        help="Headless mode: save the runs of every CPU in run order, with their rolling "
+             "median and steady state, to a file")
+
+    parser.add_argument("--window", metavar="NUM", type=int, default=25,
+        help="Window of the rolling median in runs. Default is 25")
+
+    parser.add_argument("--tolerance", metavar="FRAC", type=float, default=0.01,
+        help="Segments whose median is within this relative tolerance of the last one "
+             "are steady state. Default is 0.01")
+
+    return parser
+
+def main():
+    args = make_parser().parse_args()
+    N = len(args.filenames)
+
+    cpus = topology.parse_cpulist(args.cpus) if args.cpus else list(range(N))
+    if len(cpus) != N:
+        print(f"ERROR: {N} files but {len(cpus)} CPUs")
+        return 1
+    topo = topology.read(args.topology)
+    unknown = sorted(set(cpus) - set(topo.index))
+    if unknown:
+        print("ERROR: CPU(s) {} not found in '{}'".format(unknown, args.topology))
+        return 1
+    group_column = {"socket": "package", "node": "node", "smt": "siblings"}[args.by]
+    group_of = topo.loc[cpus, group_column].tolist()
+
+    families = [f for f in args.families.split(",") if f]
+    unknown = [f for f in families if f not in distfit.families]
+    if args.fit is not None and unknown:
+        print("ERROR: unknown families {}, expected some of {}".format(
+            unknown, distfit.families))
+        return 1
+
+    # the headless modes (fits, drift, noise) all run when several are requested, and
+    # replace the plots
+    headless = False
+    if args.fit is not None:
+        headless = True
+        with concurrent.futures.ProcessPoolExecutor(max_workers=args.jobs) as pool:
+            fits = pandas.concat(pool.map(fit_times, args.filenames, cpus,
+                                          itertools.repeat(families)))
+        fits.to_csv(args.fit, index=False)
+        print("Saved fits to {}".format(args.fit))
+        best = fits.sort_values(args.criterion, kind="stable").groupby("cpu").head(1)
+        best = best.join(topo[["package", "node", "core"]], on="cpu").sort_values("cpu")
+        print(best[["cpu", "package", "node", "core", "family", args.criterion, "p95",
+                    "empirical_p95", "p99", "empirical_p99"]].to_string(index=False))
+
+    if args.drift is not None or args.drift_plot is not None:
+        headless = True
+        with concurrent.futures.ProcessPoolExecutor(max_workers=args.jobs) as pool:
+            results = list(pool.map(drift_times, args.filenames, cpus,
+                                    itertools.repeat(args.window),
+                                    itertools.repeat(args.tolerance)))
+        report = pandas.DataFrame([row for row, _, _, _ in results])
+        report = report.join(topo[["package", "node", "core"]], on="cpu")
+        if args.drift is not None:
+            report.to_csv(args.drift, index=False)
+            print("Saved drift report to {}".format(args.drift))
+        if args.drift_plot is not None:
+            plot_drift(results, args.drift_plot)
+            print("Saved drift plot to {}".format(args.drift_plot))
+        print(report[["cpu", "package", "core", "change_points", "warmup", "steady_median",
+                      "warmup_shift", "drift", "lag1", "effective_runs"]].to_string(index=False))
+        print("Discard the first {} runs (steady state on every CPU)".format(
+            report["warmup"].max()))
+
+    if args.noise is not None or args.heatmap is not None:
+        headless = True
+        with concurrent.futures.ProcessPoolExecutor(max_workers=args.jobs) as pool:
+            rows = list(pool.map(classify, args.filenames, cpus,
+                                 itertools.repeat(args.spike_threshold)))
+        if diptest is None:
+            print("WARNING: the 'diptest' package is not installed, the dip test is skipped")
+        report = noise_report(rows).join(topo[["package", "node", "core", "smt"]], on="cpu")
+        report = report.sort_values("noise_index")
+        if args.noise is not None:
+            report.to_csv(args.noise, index=False)
+            print("Saved noise report to {}".format(args.noise))
+        if args.heatmap is not None:
+            plot_heatmap(report, args.heatmap)
+            print("Saved heatmap to {}".format(args.heatmap))
+        print(report[["cpu", "package", "node", "core", "noise_index", "spike_rate",
+                      "tail_p99", "label"]].head(16).to_string(index=False))
+
+    if headless:
+        return 0
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        results = list(pool.map(analyze, args.filenames, cpus, itertools.repeat(args.bw)))
+
+    stats = pandas.DataFrame([row for row, _, _ in results])
+    stats = stats.join(topo[["package", "node", "core"]], on="cpu")
+    for row in stats.to_dict("records"):
+        print("{} (CPU {}, socket {}, node {}, core {})".format(
+            row["file"], row["cpu"], row["package"], row["node"], row["core"]))
+        print_stats(row)
+    if args.stats is not None:
+        stats.to_csv(args.stats, index=False)
+        print("Saved statistics to {}".format(args.stats))
+
+    # ===== PER-CPU PLOTS ===============================================================
+
+    ncores = N
+    nrows = 2 if N > 1 else 1
+    ncols = -(-ncores // nrows)
+    fig = plt.figure(constrained_layout=True)
+    fig.set_size_inches(22, 10)
+    gs = gridspec.GridSpec(nrows, ncols, figure=fig)
+    axes = []
+    for col in range(ncols):
+        for row in range(nrows):
+            axes.append(fig.add_subplot(gs[row, col]))
+
+    for i, (row, curves, _) in enumerate(results):
+        ax = axes[i]
+        if i % nrows == 0 and nrows > 1:
+            ax.tick_params(bottom=False, labelbottom=False)
+        plot_cpu(ax, row, curves, topo, label=N <= 16)
+    for ax in axes[N:]:
+        ax.set_visible(False)
+
+    plt.show()
+
+    # ===== AGGREGATED PLOTS ============================================================
+
+    # times of each group, concatenated once
+    group_times = {}
+    for group, (_, _, times) in zip(group_of, results):
+        group_times.setdefault(group, []).append(times)
+    group_times = {g: numpy.concatenate(t) for g, t in
+                   sorted(group_times.items(), key=lambda kv: topology.parse_cpulist(str(kv[0])))}
+
+    gcols = min(len(group_times), 4)
+    grows = -(-len(group_times) // gcols)
+    fig = plt.figure(constrained_layout=True)
+    fig.set_size_inches(22, 10)
+    gs = gridspec.GridSpec(grows, gcols, figure=fig)
+    label = {"socket": "socket {}", "node": "NUMA node {}", "smt": "CPUs {}"}[args.by]
+    for k, (group, times) in enumerate(group_times.items()):
+        ax = fig.add_subplot(gs[k // gcols, k % gcols])
+        print(label.format(group) + ":")
+        plot_fit(times, ax, args.bw)
+        ax.set_title("{} ({} runs)".format(label.format(group), len(times)))
+    plt.show()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
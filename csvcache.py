@@ -0,0 +1,77 @@
+import hashlib
+import pathlib
+import pandas
+import numpy
+import os
+
+# Binary cache for the 'threads,time' CSV files produced by makebm.
+#
+# Each input is parsed once and stored as a .npy structured array sorted by
+# (threads, time), i.e. the samples of each thread count are contiguous and already
+# sorted. Any other column (e.g. the key columns of a multi-dimensional sweep) is
+# stored as well: numeric columns as int64/float64 and the others as fixed-width
+# unicode strings. Thanks to that order, spread.group_sort finds the thread counts
+# without sorting again. The cache entry is addressed by the hash of (absolute path,
+# mtime, size), so editing or regenerating a CSV invalidates it automatically. Entries
+# are loaded with numpy.load(mmap_mode="r"): no parsing at all on later invocations.
+
+cache_dir = pathlib.Path(os.environ.get("QPLOT_CACHE",
+                         pathlib.Path.home() / ".cache" / "qplot"))
+
+version = 2
+
+def key(filename):
+    path = pathlib.Path(filename).resolve()
+    st = path.stat()
+    ident = f"{version}:{path}:{st.st_mtime_ns}:{st.st_size}"
+    return hashlib.sha1(ident.encode()).hexdigest()
+
+def column_dtype(column):
+    if column.name == "threads":
+        return numpy.int64
+    if pandas.api.types.is_integer_dtype(column) or pandas.api.types.is_bool_dtype(column):
+        return numpy.int64
+    if pandas.api.types.is_float_dtype(column):
+        return numpy.float64
+    return f"U{max(column.astype(str).str.len().max(), 1)}"
+
+def parse(filename):
+    """Read a CSV file into a structured array sorted by (threads, time)"""
+    df = pandas.read_csv(filename).dropna(subset=["threads", "time"])
+    df["time"] = df["time"].astype(numpy.float64)
+    dtype = numpy.dtype([(c, column_dtype(df[c])) for c in df.columns])
+    data = numpy.empty(len(df), dtype=dtype)
+    for c in df.columns:
+        column = df[c]
+        if dtype[c].kind == "U":
+            column = column.fillna("").astype(str)
+        data[c] = column.to_numpy(dtype=dtype[c])
+    return data[numpy.lexsort((data["time"], data["threads"]))]
+
+def load_array(filename, use_cache=True):
+    if not use_cache:
+        return parse(filename)
+    entry = cache_dir / (key(filename) + ".npy")
+    try:
+        return numpy.load(entry, mmap_mode="r")
+    except (FileNotFoundError, ValueError):
+        pass
+    data = parse(filename)
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp = entry.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp, "wb") as f:
+            numpy.save(f, data)
+        os.replace(tmp, entry)
+    except OSError as e:
+        print(f"WARNING: could not write cache entry for '{filename}': {e}")
+    return data
+
+def load(filename, use_cache=True, columns=()):
+    """Read the 'threads' and 'time' columns of a CSV file, plus the given extra
+    'columns', as a DataFrame sorted by (threads, time) and without missing values"""
+    data = load_array(filename, use_cache)
+    missing = [c for c in columns if c not in data.dtype.names]
+    if missing:
+        raise ValueError("'{}' has no column(s) {}".format(filename, ", ".join(missing)))
+    return pandas.DataFrame({c: data[c] for c in list(columns) + ["threads", "time"]})
@@ -0,0 +1,162 @@
+from sklearn.mixture import GaussianMixture
+import scipy.optimize
+import scipy.special
+import scipy.stats
+import csvcache
+import warnings
+import hashlib
+import pandas
+import numpy
+import json
+import os
+
+# Model selection for timing distributions.
+#
+# Every family is fitted by maximum likelihood to the same (sub)sample and the fits
+# are ranked by AIC, BIC and Kolmogorov-Smirnov distance. The fitted p95 and p99 are
+# reported next to the empirical ones, to predict tail latencies. Samples larger than
+# 'max_fit' are randomly subsampled (with a fixed seed) before fitting.
+#
+# Results are cached in $QPLOT_CACHE/fits (see csvcache), keyed by the hash of the
+# sample and of the fitting options, so fitting the same data again is free.
+
+version = 1
+
+max_fit = 20000
+
+quantiles = [0.95, 0.99]
+
+scipy_families = {
+    "lognorm": scipy.stats.lognorm,
+    "gamma": scipy.stats.gamma,
+    "exponweib": scipy.stats.exponweib,
+}
+
+families = list(scipy_families) + ["shifted_expon", "gmm1", "gmm2", "gmm3", "gmm4"]
+
+class Mixture:
+    """Frozen 1D Gaussian mixture with the interface of scipy.stats distributions"""
+    def __init__(self, weights, means, stds):
+        self.weights = numpy.asarray(weights)
+        self.means = numpy.asarray(means)
+        self.stds = numpy.asarray(stds)
+
+    def logpdf(self, x):
+        x = numpy.asarray(x, dtype=numpy.float64)[..., None]
+        return scipy.special.logsumexp(
+            scipy.stats.norm.logpdf(x, self.means, self.stds), b=self.weights, axis=-1)
+
+    def cdf(self, x):
+        x = numpy.asarray(x, dtype=numpy.float64)[..., None]
+        return (self.weights * scipy.stats.norm.cdf(x, self.means, self.stds)).sum(axis=-1)
+
+    def ppf(self, q):
+        lo = (self.means - 10 * self.stds).min()
+        hi = (self.means + 10 * self.stds).max()
+        return numpy.array([scipy.optimize.brentq(lambda x: self.cdf(x) - p, lo, hi)
+                            for p in numpy.atleast_1d(q)])
+
+def fit_family(family, x, seed=0):
+    """Fit a family to a sample. Returns the frozen distribution, the number of free
+    parameters and the parameters"""
+    if family in scipy_families:
+        # the optimizer of a free location often stalls far from the optimum, so it
+        # also starts from a location just below the minimum and the best fit is kept
+        dist = scipy_families[family]
+        loc = x.min() - 0.1 * (numpy.median(x) - x.min())
+        candidates = [dist.fit(x), dist.fit(x, loc=loc, scale=numpy.median(x) - loc)]
+        params = max(candidates, key=lambda p: numpy.nan_to_num(dist.logpdf(x, *p).sum(),
+                                                                nan=-numpy.inf))
+        return dist(*params), len(params), {"params": list(params)}
+    if family == "shifted_expon":
+        loc = x.min()
+        scale = x.mean() - loc
+        return scipy.stats.expon(loc, scale), 2, {"loc": loc, "scale": scale}
+    if family.startswith("gmm"):
+        k = int(family[3:])
+        gmm = GaussianMixture(n_components=k, random_state=seed).fit(x.reshape(-1, 1))
+        order = numpy.argsort(gmm.means_.ravel())
+        weights = gmm.weights_[order]
+        means = gmm.means_.ravel()[order]
+        stds = numpy.sqrt(gmm.covariances_.ravel()[order])
+        params = {"weights": weights.tolist(), "means": means.tolist(), "stds": stds.tolist()}
+        return Mixture(weights, means, stds), 3 * k - 1, params
+    raise ValueError(f"unknown family '{family}'")
+
+def ks_distance(x, cdf):
+    """Kolmogorov-Smirnov distance between a sorted sample and a CDF"""
+    n = len(x)
+    F = cdf(x)
+    i = numpy.arange(1, n + 1)
+    return max((i / n - F).max(), (F - (i - 1) / n).max())
+
+def key(x, names, seed):
+    h = hashlib.sha1(f"{version}:{','.join(names)}:{max_fit}:{seed}:".encode())
+    h.update(numpy.ascontiguousarray(x, dtype=numpy.float64).tobytes())
+    return h.hexdigest()
+
+def fit(x, names=families, seed=0, use_cache=True):
+    """Fit every family of 'names' to a sample and rank them.
+
+    Returns a frame with one row per family, sorted by BIC, with the number of
+    parameters, the log-likelihood, AIC, BIC, KS distance, their ranks, the fitted
+    p95 and p99 and the parameters (as JSON). Failed fits have NaN statistics."""
+    x = numpy.asarray(x, dtype=numpy.float64)
+    x = x[numpy.isfinite(x)]
+    entry = csvcache.cache_dir / "fits" / (key(x, names, seed) + ".csv")
+    if use_cache:
+        try:
+            return pandas.read_csv(entry)
+        except FileNotFoundError:
+            pass
+
+    rng = numpy.random.default_rng(seed)
+    sample = x if len(x) <= max_fit else rng.choice(x, max_fit, replace=False)
+    sample = numpy.sort(sample)
+    n = len(sample)
+
+    rows = []
+    for family in names:
+        row = {"family": family}
+        try:
+            with warnings.catch_warnings(), numpy.errstate(all="ignore"):
+                warnings.simplefilter("ignore")
+                dist, k, params = fit_family(family, sample, seed)
+                loglik = dist.logpdf(sample).sum()
+                row.update({
+                    "n_params": k, "loglik": loglik,
+                    "aic": 2 * k - 2 * loglik, "bic": k * numpy.log(n) - 2 * loglik,
+                    "ks": ks_distance(sample, dist.cdf),
+                })
+                for q, v in zip(quantiles, dist.ppf(quantiles)):
+                    row[f"p{q*100:g}"] = v
+                row["params"] = json.dumps(params, default=float)
+        except (ValueError, RuntimeError, numpy.linalg.LinAlgError) as e:
+            row["params"] = json.dumps({"error": str(e)})
+        rows.append(row)
+
+    fits = pandas.DataFrame(rows)
+    for c in ("loglik", "aic", "bic", "ks"):
+        if c not in fits:
+            fits[c] = numpy.nan
+    for c in ("aic", "bic", "ks"):
+        # an infinite likelihood (e.g. a density with a singularity) is not a fit
+        fits.loc[~numpy.isfinite(fits["loglik"]), c] = numpy.nan
+        fits[f"rank_{c}"] = fits[c].rank(method="min")
+    for q, v in zip(quantiles, numpy.quantile(x, quantiles)):
+        fits[f"empirical_p{q*100:g}"] = v
+    fits = fits.sort_values("bic", kind="stable").reset_index(drop=True)
+
+    if use_cache:
+        try:
+            entry.parent.mkdir(parents=True, exist_ok=True)
+            tmp = entry.with_suffix(f".{os.getpid()}.tmp")
+            fits.to_csv(tmp, index=False)
+            os.replace(tmp, entry)
+        except OSError as e:
+            print(f"WARNING: could not write cache entry of a fit: {e}")
+    return fits
+
+def best(fits, criterion="bic"):
+    """Row of the best fit by 'criterion' (aic, bic or ks)"""
+    return fits.loc[fits[criterion].idxmin()]
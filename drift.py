@@ -0,0 +1,128 @@
+import scipy.fft
+import pandas
+import numpy
+
+# Run-order analysis of a series of timings: drift, autocorrelation, change points and
+# steady state.
+#
+# Scott A.J., Knott M.
+# 1974
+# A Cluster Analysis Method for Grouping Means in the Analysis of Variance.
+# Biometrics 30(3):507-512 (binary segmentation)
+#
+# Change points in the mean are found by binary segmentation with the squared error
+# cost: the gain of every split of a segment is computed at once from cumulative sums,
+# the best split is kept if its gain exceeds the penalty (BIC-like, 2 sigma^2 log n,
+# with sigma estimated robustly from the differences of consecutive runs) and both
+# halves are split again, in O(n log n) overall. The values are first clipped at
+# median +- 5 robust standard deviations, so that isolated spikes do not make segments.
+#
+# The steady state is the longest tail of segments whose medians are within a relative
+# tolerance of the median of the last segment: the runs before it are warm-up.
+
+def rolling_median(x, window=25):
+    """Centered rolling median of the series"""
+    return pandas.Series(x).rolling(window, center=True, min_periods=1).median().to_numpy()
+
+def autocorrelation(x, max_lag=None):
+    """Autocorrelation of the series for the lags 0..max_lag, computed with FFTs"""
+    x = numpy.asarray(x, dtype=numpy.float64)
+    n = len(x)
+    max_lag = n - 1 if max_lag is None else min(max_lag, n - 1)
+    x = x - x.mean()
+    size = scipy.fft.next_fast_len(2 * n, real=True)
+    f = scipy.fft.rfft(x, size)
+    acov = scipy.fft.irfft(f * numpy.conj(f), size)[:max_lag + 1]
+    if acov[0] == 0:
+        return numpy.zeros(max_lag + 1)
+    return acov / acov[0]
+
+def effective_size(x, max_lag=1000):
+    """Number of independent runs the series is worth: n / (1 + 2 sum rho_k), summing
+    the autocorrelations up to the first non-positive one"""
+    rho = autocorrelation(x, max_lag)[1:]
+    cut = numpy.flatnonzero(rho <= 0)
+    rho = rho[:cut[0]] if len(cut) else rho
+    return len(x) / (1 + 2 * rho.sum())
+
+def robust_sigma(x):
+    """Standard deviation of the noise, from the MAD of the differences of consecutive
+    runs (insensitive to shifts of the mean)"""
+    d = numpy.diff(x)
+    return 1.4826 * numpy.median(numpy.abs(d - numpy.median(d))) / numpy.sqrt(2)
+
+def change_points(x, penalty=None, min_size=10):
+    """Indices where the mean of the series changes, by binary segmentation. Every
+    segment has at least 'min_size' runs. The default penalty is 2 sigma^2 log n"""
+    x = numpy.asarray(x, dtype=numpy.float64)
+    n = len(x)
+    sigma = robust_sigma(x) if n > 2 else 0.0
+    if sigma == 0:
+        sigma = numpy.std(x) or 1.0
+    median = numpy.median(x)
+    x = numpy.clip(x, median - 5 * sigma, median + 5 * sigma)
+    if penalty is None:
+        penalty = 2 * sigma**2 * numpy.log(n)
+    S = numpy.append(0, numpy.cumsum(x))
+
+    points = []
+    stack = [(0, n)]
+    while stack:
+        a, b = stack.pop()
+        if b - a < 2 * min_size:
+            continue
+        k = numpy.arange(a + min_size, b - min_size + 1)
+        left, right, total = S[k] - S[a], S[b] - S[k], S[b] - S[a]
+        gain = left**2 / (k - a) + right**2 / (b - k) - total**2 / (b - a)
+        best = numpy.argmax(gain)
+        if gain[best] > penalty:
+            points.append(k[best])
+            stack.extend(((a, k[best]), (k[best], b)))
+    return sorted(points)
+
+def segments(x, points):
+    """Frame of the segments between the change points: 'start', 'end' (exclusive),
+    'runs', 'median' and 'mean'"""
+    x = numpy.asarray(x, dtype=numpy.float64)
+    bounds = [0] + list(points) + [len(x)]
+    return pandas.DataFrame([{
+        "start": a, "end": b, "runs": b - a,
+        "median": numpy.median(x[a:b]), "mean": x[a:b].mean(),
+    } for a, b in zip(bounds[:-1], bounds[1:])])
+
+def steady_state(segs, tolerance=0.01):
+    """Index of the first segment of the steady state: the longest tail of segments
+    whose medians are within 'tolerance' (relative) of the median of the last one"""
+    last = segs["median"].iloc[-1]
+    close = (segs["median"] - last).abs() <= tolerance * abs(last)
+    first = len(segs) - 1
+    while first > 0 and close.iloc[first - 1]:
+        first -= 1
+    return first
+
+def analyze(x, window=25, tolerance=0.01, penalty=None, min_size=10):
+    """Drift report of a series: the number of change points, the warm-up runs to
+    discard, the median of the steady state and its relative difference with the
+    median of the warm-up, the relative drift of the rolling median, the lag-1
+    autocorrelation and the effective number of runs of the steady state. Returns the
+    report, the segments and the rolling median"""
+    x = numpy.asarray(x, dtype=numpy.float64)
+    points = change_points(x, penalty, min_size)
+    segs = segments(x, points)
+    first = steady_state(segs, tolerance)
+    warmup = int(segs["start"].iloc[first])
+    steady = x[warmup:]
+    smooth = rolling_median(x, window)
+    median = numpy.median(steady)
+    report = {
+        "runs": len(x),
+        "change_points": len(points),
+        "warmup": warmup,
+        "steady_runs": len(steady),
+        "steady_median": median,
+        "warmup_shift": numpy.median(x[:warmup]) / median - 1 if warmup else 0.0,
+        "drift": (smooth.max() - smooth.min()) / median,
+        "lag1": autocorrelation(steady, 1)[1] if len(steady) > 1 else numpy.nan,
+        "effective_runs": effective_size(steady) if len(steady) > 1 else len(steady),
+    }
+    return report, segs, smooth
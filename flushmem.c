@@ -1,26 +1,83 @@
+#include <ctype.h>
+#include <fcntl.h>
 #include <omp.h>
 #include <stdio.h>
 #include <stdlib.h>
+#include <string.h>
 #include <unistd.h>
 
+// usage: flushmem [-y] [SIZE]
+//        flushmem -f FILE...
+//
+// Allocates and dirties SIZE bytes of memory (default 90% of the RAM) in parallel,
+// evicting the caches and most of the page cache. SIZE is in GB, or has a K, M or G
+// suffix (e.g. 64M). Without -y it asks for confirmation and waits for a key before
+// freeing the memory. With -f it drops the pages of the files from the page cache
+// instead (posix_fadvise DONTNEED, after writing back the dirty ones).
+//
+// Build: cc -O2 -fopenmp -o flushmem flushmem.c
+
+static size_t parse_size(const char *text) {
+  char *end;
+  double value = strtod(text, &end);
+  switch (toupper(*end)) {
+  case 'K':
+    return (size_t)(value * 1024);
+  case 'M':
+    return (size_t)(value * 1024 * 1024);
+  default:
+    return (size_t)(value * 1024 * 1024 * 1024);
+  }
+}
+
+static int drop_files(int n, char *files[]) {
+  int rc = 0;
+  for (int i = 0; i < n; i++) {
+    int fd = open(files[i], O_RDONLY);
+    if (fd < 0) {
+      perror(files[i]);
+      rc = 1;
+      continue;
+    }
+    fdatasync(fd);
+    int err = posix_fadvise(fd, 0, 0, POSIX_FADV_DONTNEED);
+    if (err) {
+      fprintf(stderr, "%s: posix_fadvise: %s\n", files[i], strerror(err));
+      rc = 1;
+    }
+    close(fd);
+  }
+  return rc;
+}
+
 int main(int argc, char *argv[]) {
   long pages = sysconf(_SC_PHYS_PAGES);
   long page_size = sysconf(_SC_PAGE_SIZE);
   size_t total_bytes = (size_t)pages * page_size;
   size_t flush_bytes = total_bytes * 9 / 10;
+  int interactive = 1;
 
-  if (argc >= 2) {
-    double gb = atof(argv[1]);
-    flush_bytes = (size_t)(gb * 1024 * 1024 * 1024);
+  int arg = 1;
+  if (arg < argc && strcmp(argv[arg], "-f") == 0) {
+    return drop_files(argc - arg - 1, argv + arg + 1);
+  }
+  if (arg < argc && strcmp(argv[arg], "-y") == 0) {
+    interactive = 0;
+    arg++;
+  }
+  if (arg < argc) {
+    flush_bytes = parse_size(argv[arg]);
   }
 
   double flush_gb = flush_bytes / (1024.0 * 1024 * 1024);
-  printf("About to allocate and flush ~%.2f GB of memory.\n", flush_gb);
-  printf("Press 'y' to proceed: ");
-  int c = getchar();
-  if (c != 'y' && c != 'Y') {
-    printf("Aborted.\n");
-    return 0;
+  if (interactive) {
+    printf("About to allocate and flush ~%.2f GB of memory.\n", flush_gb);
+    printf("Press 'y' to proceed: ");
+    int c = getchar();
+    if (c != 'y' && c != 'Y') {
+      printf("Aborted.\n");
+      return 0;
+    }
   }
 
   char *buffer = malloc(flush_bytes);
@@ -44,9 +101,10 @@ int main(int argc, char *argv[]) {
   }
 
   printf("Touched %.2f GB (1 byte per page), checksum: %lld\n", flush_gb, sum);
-  getchar();
+  if (interactive) {
+    getchar();
+  }
 
   free(buffer);
   return 0;
 }
-
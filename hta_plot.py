@@ -35,7 +35,7 @@ df_ridge['TargetPct'] = pd.Categorical(df_ridge['TargetPct'], categories=sorted(
 global_x95 = np.percentile(df_ridge['HittingTime'].dropna(), 95)
 
 # --- Manual vertical ridgeline plot using matplotlib ---
-import scipy.stats as stats
+import kde
 
 targets_sorted = df_ridge['TargetPct'].cat.categories
 num_targets = len(targets_sorted)
@@ -47,14 +47,19 @@ yticks = []
 ylabels = []
 max_density = 0
 
+# KDE of all the targets at once, on a common grid
+subsets = {target: df_ridge[df_ridge['TargetPct'] == target]['HittingTime'].dropna().values
+           for target in targets_sorted}
+subsets = {target: subset for target, subset in subsets.items() if len(subset) >= 2}
+y = np.linspace(0, global_x95, 400)
+_, densities = kde.density(list(subsets.values()), y)
+densities = dict(zip(subsets, densities))
+
 for i, (target, color) in enumerate(zip(targets_sorted, colors)):
-    subset = df_ridge[df_ridge['TargetPct'] == target]['HittingTime'].dropna().values
-    if len(subset) < 2:
+    if target not in densities:
         continue
-    # KDE
-    kde = stats.gaussian_kde(subset)
-    y = np.linspace(0, global_x95, 400)
-    density = kde(y)
+    subset = subsets[target]
+    density = densities[target]
     # Normalize and offset for stacking
     density = density / density.max() * 0.8  # scale for visual separation
     offset = i
@@ -1,7 +1,11 @@
 import matplotlib.pyplot as plt
+import scipy.sparse
+import csvcache
 import pathlib
 import pandas
+import spread
 import numpy
+import json
 import sys
 
 # For scientific references see:
@@ -11,6 +15,43 @@ import sys
 # Benchmarking Optimization Software with Performance Profiles.
 # Mathematical Programming 91(2):201–213
 # https://link.springer.com/article/10.1007/s101070100263
+#
+# Moré J.J., Wild S.M.
+# 2009
+# Benchmarking Derivative-Free Optimization Algorithms.
+# SIAM Journal on Optimization 20(1):172-191
+# https://doi.org/10.1137/080724083
+#
+# Failures (NaN or infinite values) get the ratio r_M, larger than any ratio of a
+# solved problem, so that they are never counted for tau < r_M. A problem no method
+# solves is a failure for all of them. Data profiles show instead the fraction of
+# problems solved within a budget of alpha units, where the cost of each problem (e.g.
+# function evaluations or time) is divided by its own budget unit (e.g. n_p + 1).
+#
+# The (problems x methods) matrix of ratios to the best method is computed once and
+# each column is sorted, so the profile rho(tau) of every method is a searchsorted()
+# away for any tau. Instead of one step per problem, the profile is evaluated on an
+# adaptive tau grid: 'resolution' uniformly spaced values of tau plus the ratios at
+# which each profile crosses one of 'resolution' levels of rho. Only the points where
+# rho changes are drawn, so the cost of rendering does not depend on the number of
+# problems (for fewer problems than 'resolution' the curves are exact).
+#
+# Bootstrap. A replicate resamples the problems with replacement and is represented by
+# the multiplicity of each problem, so a chunk of replicates is a (replicates x
+# problems) matrix W. With the ratios binned on a tau grid as a sparse one-hot matrix,
+# the profiles of all the replicates and methods are a single product with W. At most
+# 'chunk' elements of W exist at any time, whatever the number of problems.
+#
+# makebm results. Instead of a wide CSV, the matrix can be built from the CSV files of
+# makebm, listed in its summary files (one JSON object per line, with the CSV file in
+# 'file') or given directly. The method and the problem of each CSV file come from
+# fields of its JSON object (the file name for CSV files without summary) and every
+# thread count, and every value of the key columns given with --keys, is a separate
+# problem. The other columns (rusage, counters, flush or partition of makebm) are
+# measurements or run settings, not problems, and are ignored. The
+# files are read one at a time through the binary cache of qplot, the repeated runs
+# are reduced to their median ('fair') or minimum ('pessimistic') right away, and only
+# the aggregates are kept to fill a float32 matrix.
 
 def set_defaults(kwargs):
     defaults = dict()
@@ -20,72 +61,360 @@ def set_defaults(kwargs):
     defaults["reverse"] = False
     defaults["marker"] = "."
     defaults["marker_size"] = 10
-    defaults["title"] = "Performance Profile"
-    defaults["xlabel"] = "Ratio to best"
+    defaults["title"] = "Data Profile" if kwargs.get("data_profile") else "Performance Profile"
+    defaults["xlabel"] = "Budget units" if kwargs.get("data_profile") else "Ratio to best"
     defaults["ylabel"] = "How many"
+    defaults["resolution"] = 1000
+    defaults["makebm"] = False
+    defaults["method"] = "notes"
+    defaults["problem"] = "cmd"
+    defaults["attitude"] = "fair"
     defaults.update(kwargs)
     kwargs.update(defaults)
 
 def plot_file(**kwargs):
     set_defaults(kwargs)
-    df = pandas.read_csv(kwargs["input"])
+    inputs = kwargs["input"] if isinstance(kwargs["input"], list) else [kwargs["input"]]
+    if kwargs["makebm"]:
+        keys = kwargs["keys"].split(",") if kwargs.get("keys") else ()
+        df = load_makebm(inputs, kwargs["method"].split(","), kwargs["problem"].split(","),
+                         kwargs["attitude"], kwargs.get("threads"), keys=keys)
+    elif len(inputs) > 1:
+        print("ERROR: multiple inputs are only supported with --makebm")
+        sys.exit(1)
+    elif kwargs.get("keys"):
+        print("ERROR: --keys is only supported with --makebm")
+        sys.exit(1)
+    else:
+        df = pandas.read_csv(inputs[0])
+    kwargs["input"] = inputs[0]
     plot_dataframe(df, **kwargs)
 
+def makebm_runs(filenames, method_fields=("notes",), problem_fields=("cmd",)):
+    """(CSV file, method, problem) of every makebm CSV file. Summary files (.json) list
+    the CSV files of their campaigns, relative to the directory of the summary. The
+    method and the problem are the tuples of the given fields of the JSON object; a
+    CSV file given directly is a method named after the file, with an empty problem"""
+    for filename in filenames:
+        path = pathlib.Path(filename)
+        if path.suffix != ".json":
+            yield str(path), (path.stem,), ("",) * len(problem_fields)
+            continue
+        with open(path) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                csv = pathlib.Path(entry["file"])
+                if not csv.is_absolute():
+                    csv = path.parent / csv
+                yield (str(csv),
+                       tuple(str(entry.get(k, "")) for k in method_fields),
+                       tuple(str(entry.get(k, "")) for k in problem_fields))
+
+def aggregate(data, statistic="median", keys=()):
+    """Median or minimum time of the repeated runs of a makebm structured array, for
+    each thread count and combination of the extra 'keys' columns. Returns the key
+    columns, the unique keys and the aggregated times"""
+    keys = ["threads"] + [k for k in keys if k != "threads"]
+    uniques, codes = numpy.unique(data[keys], return_inverse=True)
+    v, start, n, _ = spread.group_sort([codes.ravel()], numpy.asarray(data["time"]))
+    if statistic == "median":
+        return keys, uniques, spread.quantile(v, start, n, 0.5)
+    return keys, uniques, v[start]
+
+def load_makebm(filenames, method_fields=("notes",), problem_fields=("cmd",),
+                attitude="fair", threads=None, use_cache=True, keys=()):
+    """(problems x methods) float32 frame of the aggregated times of makebm results,
+    with one problem per thread count and combination of the extra 'keys' columns"""
+    statistic = {"fair": "median", "pessimistic": "min"}[attitude]
+    problems, methods = {}, {}
+    rows, cols, values = [], [], []
+    key_names = None
+    for csv, method, problem in makebm_runs(filenames, method_fields, problem_fields):
+        try:
+            data = csvcache.load_array(csv, use_cache)
+        except (OSError, KeyError, ValueError) as e:
+            print(f"WARNING: skipping '{csv}': {e}")
+            continue
+        missing = [k for k in keys if k not in data.dtype.names]
+        if missing:
+            print("WARNING: skipping '{}': no column(s) {}".format(csv, ", ".join(missing)))
+            continue
+        if threads is not None:
+            data = data[data["threads"] == threads]
+        key_names, uniques, times = aggregate(data, statistic, keys)
+        col = methods.setdefault(method, len(methods))
+        for key, t in zip(uniques.tolist(), times):
+            rows.append(problems.setdefault(problem + tuple(key), len(problems)))
+            cols.append(col)
+            values.append(t)
+
+    matrix = numpy.full((len(problems), len(methods)), numpy.nan, dtype=numpy.float32)
+    matrix[rows, cols] = values
+    index = pandas.MultiIndex.from_tuples(list(problems),
+                                          names=list(problem_fields) + (key_names or []))
+    columns = [" ".join(m) for m in methods]
+    return pandas.DataFrame(matrix, index=index, columns=columns)
+
+def ratio_matrix(values, problem_type="min", penalty=None):
+    """Ratios of a (problems x methods) matrix to the best method of each problem.
+
+    NaN and infinite values are failures and get the ratio r_M: 'penalty' if given,
+    otherwise twice the largest ratio of the solved problems. For 'max' problems the
+    ratios are best/value inverted, so r_M becomes 1/r_M. Returns the ratios and r_M"""
+    values = numpy.asarray(values, dtype=numpy.float64)
+    failed = ~numpy.isfinite(values)
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        if problem_type == "min":
+            best = numpy.where(failed, numpy.inf, values).min(axis=1, keepdims=True)
+            ratios = values / best
+        else:
+            best = numpy.where(failed, -numpy.inf, values).max(axis=1, keepdims=True)
+            ratios = best / values
+    failed |= ~numpy.isfinite(ratios)
+    if penalty is None:
+        penalty = 2 * ratios[~failed].max() if (~failed).any() else 2.0
+    ratios[failed] = penalty
+    if problem_type != "min":
+        return 1 / ratios, 1 / penalty
+    return ratios, penalty
+
+def cost_matrix(values, budget=None):
+    """Cost of a (problems x methods) matrix in budget units of each problem, for data
+    profiles. Failures (NaN or infinite values) get an infinite cost"""
+    values = numpy.asarray(values, dtype=numpy.float64)
+    if budget is not None:
+        values = values / numpy.asarray(budget, dtype=numpy.float64)[:, None]
+    return numpy.where(numpy.isfinite(values), values, numpy.inf)
+
+def tau_grid(sorted_ratios, resolution=1000, xlimit=None):
+    """Values of tau at which the profiles are evaluated: a uniform grid over the range
+    of the ratios (up to 'xlimit') and the ratios at 'resolution' levels of rho of
+    every method. 'sorted_ratios' is the ratio matrix sorted along the problems"""
+    N = len(sorted_ratios)
+    finite = sorted_ratios[numpy.isfinite(sorted_ratios)]
+    if len(finite) == 0:
+        return numpy.empty(0)
+    lo, hi = finite.min(), finite.max()
+    if xlimit is not None:
+        hi = max(lo, min(hi, xlimit))
+    levels = numpy.unique(numpy.ceil(numpy.linspace(0, N, resolution + 1)[1:]).astype(int)) - 1
+    taus = numpy.concatenate((numpy.linspace(lo, hi, resolution), sorted_ratios[levels].ravel()))
+    return numpy.unique(taus[numpy.isfinite(taus)])
+
+def profile(sorted_ratios, taus):
+    """Fraction of problems with a ratio <= tau, for every tau (rows) and method (columns)"""
+    N = len(sorted_ratios)
+    return numpy.stack([numpy.searchsorted(column, taus, side="right")
+                        for column in sorted_ratios.T], axis=1) / N
+
+def breakpoints(taus, rho):
+    """Points of a step profile where rho changes, for each column of 'rho'"""
+    out = []
+    for column in rho.T:
+        keep = numpy.flatnonzero(numpy.diff(column, prepend=-1) != 0)
+        keep = keep[column[keep] > 0]
+        out.append((taus[keep], column[keep]))
+    return out
+
+chunk = 2**22
+
+def band_grid(ratios, resolution=200, xlimit=None):
+    """Small tau grid for the bootstrap bands: uniform over the range of the finite
+    ratios (up to 'xlimit') plus 'resolution' quantiles of all of them"""
+    finite = ratios[numpy.isfinite(ratios)]
+    if xlimit is not None:
+        finite = finite[finite <= xlimit]
+    if len(finite) == 0:
+        return numpy.empty(0)
+    levels = numpy.linspace(0, 1, resolution)
+    return numpy.unique(numpy.concatenate((
+        numpy.linspace(finite.min(), finite.max(), resolution),
+        numpy.quantile(finite, levels))))
+
+def bootstrap(ratios, taus, B=1000, confidence=0.95, tau_min=1.0, tau_max=None, seed=None,
+              tau=None):
+    """Bootstrap of the profiles of a (problems x methods) matrix of ratios, resampling
+    the problems.
+
+    Returns the lower and upper confidence bands of rho at 'taus' (taus x methods) and,
+    for each method, the fraction of the replicates in which it ranks first by rho at
+    'tau' (default 'tau_min') and by area under the profile over [tau_min, tau_max]. A
+    tie is split evenly between the tied methods, so each fraction sums to 1 over the
+    methods. Memory is O(B * taus * methods) for the bands plus 'chunk'."""
+    ratios = numpy.asarray(ratios, dtype=numpy.float64)
+    N, M = ratios.shape
+    G = len(taus)
+    rng = numpy.random.default_rng(seed)
+    tau_max = taus[-1] if tau_max is None else tau_max
+
+    # one-hot of the first tau >= ratio, one block of G+1 columns per method
+    bins = numpy.searchsorted(taus, ratios, side="left")
+    onehot = scipy.sparse.csr_matrix(
+        (numpy.ones(N * M), (numpy.repeat(numpy.arange(N), M),
+                             (numpy.arange(M) * (G + 1) + bins).ravel())),
+        shape=(N, M * (G + 1))).T.tocsr()
+    first = (ratios <= (tau_min if tau is None else tau)).astype(numpy.float64)
+    area = (tau_max - numpy.clip(ratios, tau_min, tau_max)) / (tau_max - tau_min)
+
+    rho = numpy.empty((B, G, M), dtype=numpy.float32)
+    first_wins = numpy.zeros(M)
+    area_wins = numpy.zeros(M)
+    step = max(1, chunk // N)
+    for b in range(0, B, step):
+        n = min(step, B - b)
+        idx = rng.integers(0, N, size=(n, N)) + N * numpy.arange(n)[:, None]
+        W = numpy.bincount(idx.ravel(), minlength=n * N).reshape(n, N).astype(numpy.float64)
+        counts = (onehot @ W.T).T.reshape(n, M, G + 1)
+        rho[b:b+n] = numpy.cumsum(counts, axis=2)[:, :, :G].transpose(0, 2, 1) / N
+        for stat, wins in ((W @ first, first_wins), (W @ area, area_wins)):
+            best = stat == stat.max(axis=1, keepdims=True)
+            wins += (best / best.sum(axis=1, keepdims=True)).sum(axis=0)
+
+    alpha = (1 - confidence) / 2
+    lower, upper = numpy.quantile(rho, [alpha, 1 - alpha], axis=0)
+    return lower, upper, first_wins / B, area_wins / B
+
+def ranking(ratios, methods, first, area, tau_min=1.0, tau_max=None, tau=None):
+    """Table of rho at 'tau' (default 'tau_min') and area under the profile of every
+    method over [tau_min, tau_max], with the fraction of bootstrap replicates in which
+    each one ranks first"""
+    finite = ratios[numpy.isfinite(ratios)]
+    tau_max = finite.max() if tau_max is None else tau_max
+    clipped = numpy.clip(ratios, tau_min, tau_max)
+    return pandas.DataFrame({
+        "rho_min": (ratios <= (tau_min if tau is None else tau)).mean(axis=0),
+        "first_rho_min": first,
+        "area": ((tau_max - clipped) / (tau_max - tau_min)).mean(axis=0),
+        "first_area": area,
+    }, index=pandas.Index(methods, name="method"))
+
+def problem_sets(df, column=None):
+    """{name: rows} of every problem set, or the whole frame if there is no 'column'"""
+    if column is None:
+        return {None: df}
+    if column in df.index.names:
+        return dict(iter(df.groupby(level=column, sort=True)))
+    if column not in df.columns:
+        print(f"ERROR: no column named '{column}'")
+        sys.exit(1)
+    return {name: rows.drop(columns=column) for name, rows in df.groupby(column, sort=True)}
+
 def plot_dataframe(df, **kwargs):
     set_defaults(kwargs)
 
-    fig, axs = plt.subplots(1)
-    if kwargs["problem_type"] == "min":
-        get_best = pandas.DataFrame.min
-    else:
-        get_best = pandas.DataFrame.max
-
-    best = get_best(df, axis=1)
+    budget = None
+    if kwargs.get("budget") is not None:
+        if kwargs["budget"] not in df.columns:
+            print("ERROR: no budget column named '{}'".format(kwargs["budget"]))
+            sys.exit(1)
+        budget = df[kwargs["budget"]]
+        df = df.drop(columns=kwargs["budget"])
 
-    N = len(df)
-    y = numpy.linspace(0.0, 1.0, N+1)[1:]
+    sets = problem_sets(df, kwargs.get("problem_set"))
+    fig, axs = plt.subplots(1, len(sets), squeeze=False)
+    methods = next(iter(sets.values())).columns
+    resolution = kwargs["resolution"]
+    data_profile = kwargs.get("data_profile", False)
+    B = kwargs.get("bootstrap", 0)
+    if B > 0 and kwargs["problem_type"] != "min" and not data_profile:
+        print("ERROR: --bootstrap requires a 'min' problem type")
+        sys.exit(1)
 
     if "letters" in kwargs:
         if kwargs["letters"] != "":
-            if len(kwargs["letters"]) < len(df.columns):
+            if len(kwargs["letters"]) < len(methods):
                 print("ERROR: not enough letters specified")
                 sys.exit(1)
 
-    for i, method in enumerate(df.columns):
-        vals = df[method]
-        marker = kwargs["marker"]
-        if "letters" in kwargs:
-            if kwargs["letters"] == "":
-                marker = r"${}$".format(chr(ord("A")+i))
+    for ax, (name, rows) in zip(axs[0], sets.items()):
+        plt.sca(ax)
+        N = len(rows)
+        if data_profile:
+            units = None if budget is None else budget.loc[rows.index]
+            ratios = cost_matrix(rows.to_numpy(), units)
+            penalty = numpy.inf
+            xlimit = None
+        else:
+            ratios, penalty = ratio_matrix(rows.to_numpy(), kwargs["problem_type"],
+                                           kwargs.get("penalty"))
+            xlimit = None if kwargs["reverse"] else kwargs["xlimit"]
+        if B > 0:
+            band_taus = band_grid(ratios, xlimit=xlimit)
+            tau_min = 0.0 if data_profile else 1.0
+            tau_max = min(xlimit or numpy.inf, ratios[numpy.isfinite(ratios)].max())
+            # rho is about 0 for every method of a data profile at the smallest budgets:
+            # rank them at the median cost instead, unless a budget is given
+            tau = kwargs.get("tau")
+            if tau is None:
+                tau = numpy.median(ratios[numpy.isfinite(ratios)]) if data_profile else 1.0
+            lower, upper, first, area = bootstrap(ratios, band_taus, B,
+                                                  kwargs.get("confidence", 0.95),
+                                                  tau_min, tau_max, kwargs.get("seed"), tau)
+            table = ranking(ratios, methods, first, area, tau_min, tau_max, tau)
+            if name is not None:
+                print("{} ({} problems)".format(name, N))
+            print(table.rename(columns={
+                "rho_min": f"rho({tau:.3g})", "first_rho_min": f"P(first at {tau:.3g})",
+                "area": "area", "first_area": "P(first by area)"}).to_string(
+                float_format=lambda v: f"{v:.3f}"))
+        ratios = numpy.sort(ratios, axis=0)
+        taus = tau_grid(ratios, resolution, xlimit)
+        curves = breakpoints(taus, profile(ratios, taus))
+
+        for i, method in enumerate(methods):
+            marker = kwargs["marker"]
+            if "letters" in kwargs:
+                if kwargs["letters"] == "":
+                    marker = r"${}$".format(chr(ord("A")+i))
+                else:
+                    marker = r"${}$".format(kwargs["letters"][i])
+            x, y = curves[i]
+            # failures only show up at r_M
+            solved = x < penalty if kwargs["problem_type"] == "min" or data_profile else x > penalty
+            x, y = x[solved], y[solved]
+            x = 1 / x if kwargs["reverse"] and not data_profile else x
+            # one marker per problem is only readable for small problem sets
+            markevery = max(1, len(x) // 50) if N > resolution else None
+            line, = plt.step(x, y, where="post", label=method, marker=marker,
+                             markersize=kwargs["marker_size"], markevery=markevery)
+            if B > 0:
+                band_x = 1 / band_taus if kwargs["reverse"] and not data_profile else band_taus
+                plt.fill_between(band_x, lower[:, i], upper[:, i], step="post",
+                                 color=line.get_color(), alpha=0.2)
+
+        if name is not None:
+            plt.title("{} ({} problems)".format(name, N))
+        plt.xlabel(kwargs["xlabel"])
+        plt.ylabel(kwargs["ylabel"])
+        ticks = numpy.linspace(0, 1, 11)
+        tick_names = [f"{t*100:.0f}%" for t in ticks]
+
+        plt.yticks(ticks, tick_names)
+        if kwargs.get("log2"):
+            ax.set_xscale("log", base=2)
+        if data_profile:
+            plt.xlim(left=0 if not kwargs.get("log2") else None)
+        elif not kwargs["reverse"]:
+            right = min(plt.xlim()[1], kwargs["xlimit"])
+            plt.xlim(left=1, right=right)
+        plt.grid(True, linewidth=0.1)
+
+        if kwargs["problem_type"] == "min" or data_profile:
+            if kwargs["reverse"] and not data_profile:
+                plt.legend(loc="lower left")
+            else:
+                plt.legend(loc="lower right")
+        else:
+            if kwargs["reverse"]:
+                plt.legend(loc="upper right")
             else:
-                marker = r"${}$".format(kwargs["letters"][i])
-        x = (vals / best).sort_values()
-        x = 1 / x if kwargs["reverse"] else x
-        plt.step(x, y, where="post", label=method,
-                 marker=marker, markersize=kwargs["marker_size"])
+                plt.legend(loc="upper left")
 
     fig.suptitle(kwargs["title"])
-    plt.xlabel(kwargs["xlabel"])
-    plt.ylabel(kwargs["ylabel"])
-    ticks = numpy.linspace(0, 1, 11)
-    tick_names = [f"{t*100:.0f}%" for t in ticks]
-
-    plt.yticks(ticks, tick_names)
-    if not kwargs["reverse"]:
-        right = min(plt.xlim()[1], kwargs["xlimit"])
-        plt.xlim(left=1, right=right)
-    plt.grid(True, linewidth=0.1)
-
-    if kwargs["problem_type"] == "min":
-        if kwargs["reverse"]:
-            plt.legend(loc="lower left")
-        else:
-            plt.legend(loc="lower right")
-    else:
-        if kwargs["reverse"]:
-            plt.legend(loc="upper right")
-        else:
-            plt.legend(loc="upper left")
+    if len(sets) > 1:
+        fig.set_size_inches(6 * len(sets), 5)
 
     if "output" in kwargs:
         plt.savefig(kwargs["output"])
@@ -105,8 +434,9 @@ if __name__ == "__main__":
     parser.add_argument("-p", "--problem-type", type=str, choices=["min", "max"],
         help="Maximization or minimization problem. Default is 'min'", default="min")
 
-    parser.add_argument("input", metavar="CSV_FILE", type=str,
-        help="Input CSV file containing a column per method")
+    parser.add_argument("input", metavar="CSV_FILE", type=str, nargs="+",
+        help="Input CSV file containing a column per method. With --makebm, any number "
+             "of makebm summary files (.json) and CSV files")
 
     parser.add_argument("-x", "--xlimit", type=float, default=10,
         help="Right limit of x-axis. Default is 10")
@@ -135,6 +465,69 @@ if __name__ == "__main__":
     parser.add_argument("-z", "--marker-size", type=int, default=10,
         help="Set the size of the marker. Default is 10")
 
+    parser.add_argument("--penalty", type=float,
+        help="Ratio r_M given to failures (NaN or infinite values). Default is twice "
+             "the largest ratio of the solved problems")
+
+    parser.add_argument("--data-profile", action="store_true",
+        help="Draw Moré-Wild data profiles: the fraction of problems solved by each "
+             "method within a budget, instead of the ratio to the best method")
+
+    parser.add_argument("--budget", type=str,
+        help="Column with the budget unit of each problem (e.g. n+1 function "
+             "evaluations), dividing the costs of the data profiles")
+
+    parser.add_argument("--problem-set", type=str,
+        help="Column naming the set each problem belongs to. One plot per set")
+
+    parser.add_argument("--log2", action="store_true",
+        help="Use a log2 scale for the x-axis")
+
+    parser.add_argument("--bootstrap", metavar="B", type=int, default=0,
+        help="Draw confidence bands around the profiles from B resamples of the "
+             "problems, and report how often each method ranks first at --tau and by "
+             "area under the profile (ties are split between the tied methods). "
+             "E.g.: --bootstrap 1000")
+
+    parser.add_argument("--tau", type=float,
+        help="Ratio (or budget, for --data-profile) at which --bootstrap ranks the "
+             "methods by rho. Default is 1, or the median cost for --data-profile")
+
+    parser.add_argument("--confidence", metavar="LEVEL", type=float, default=0.95,
+        help="Confidence level of --bootstrap. Default is 0.95")
+
+    parser.add_argument("--seed", metavar="NUM", type=int,
+        help="Seed of the random generator used by --bootstrap")
+
+    parser.add_argument("--resolution", type=int, default=1000,
+        help="Number of levels of the profiles (and of points of the tau grid). Problem "
+             "sets larger than this are drawn with at most this many steps per method. "
+             "Default is 1000")
+
+    parser.add_argument("--makebm", action="store_true",
+        help="Build the problems x methods matrix from makebm results")
+
+    parser.add_argument("--method", type=str, default="notes",
+        help="Comma-separated fields of the makebm summary naming the method of a "
+             "campaign. Default is 'notes'")
+
+    parser.add_argument("--problem", type=str, default="cmd",
+        help="Comma-separated fields of the makebm summary naming the problem of a "
+             "campaign, together with the thread count and the --keys columns of its "
+             "CSV file. Default is 'cmd'")
+
+    parser.add_argument("-k", "--keys", type=str, default=None,
+        help="With --makebm, comma-separated extra columns of the CSV files (e.g. "
+             "'size') whose values are separate problems. The other columns, such as the "
+             "rusage or the counters, are ignored")
+
+    parser.add_argument("--attitude", type=str, choices=["fair", "pessimistic"], default="fair",
+        help="Aggregate the repeated runs of --makebm by 'median' (fair) or 'min' "
+             "(pessimistic). Default is 'fair'")
+
+    parser.add_argument("--threads", type=int,
+        help="Only use the runs of --makebm with this number of threads")
+
     parser.add_argument("-o", "--output", type=str,
         help="Dump plot to a specified file")
 
@@ -1,300 +1,1260 @@
 import matplotlib.gridspec as gridspec
 import matplotlib.pyplot as plt
-import scipy.optimize
+import concurrent.futures
+import scalability
+import matplotlib
+import csvcache
+import bootstrap
+import twosample
 import argparse
+import pathlib
 import pandas
+import sketch
 import spread
 import numpy
+import time
 import sys
+import os
+
+preferred_colors = ["#5588dd", "#882255", "#33bb88", "#ddcc77",
+                    "#cc6677", "#999933", "#aa44ff", "#448811",
+                    "#3fa7d6", "#e94f37", "#6cc551", "#dabef9"]
+name_sep = "::"
 
 # ===== COMMAND LINE ARGUMENTS ==========================================================
 
-parser = argparse.ArgumentParser(
-    description="Generating speedup plots from raw time measurements in CSV format.\n"
-                "The CSV input files must contain a column named 'threads' and one "
-                "named 'time' (in ms).\n")
+def make_parser():
+    parser = argparse.ArgumentParser(
+        description="Generating speedup plots from raw time measurements in CSV format.\n"
+                    "The CSV input files must contain a column named 'threads' and one "
+                    "named 'time' (in ms).\n"
+                    "Use 'qplot.py compare OLD NEW' to test two campaigns for regressions.")
 
-parser.add_argument("filenames", metavar="FILENAMES", type=str, nargs="+",
-    help="One or more CSV files containing the columns 'threads' and 'time' (in ms)")
+    parser.add_argument("filenames", metavar="FILENAMES", type=str, nargs="*",
+        help="One or more CSV files containing the columns 'threads' and 'time' (in ms)")
 
-parser.add_argument("-u", "--unit", type=str, choices=["s", "ms"], default="s", 
-    help="Time unit. Default is 's' (seconds)")
+    parser.add_argument("-u", "--unit", type=str, choices=["s", "ms"], default="s",
+        help="Time unit. Default is 's' (seconds)")
 
-parser.add_argument("-b", "--baseline", metavar="FILENAME", type=str, default=None,
-    help="The file from which to extract the baseline used for the calculation of the speedup."
-         "In case there are runs with different numbers of threads, only thread==1 "
-         "runs are considered")
+    parser.add_argument("-b", "--baseline", metavar="FILENAME", type=str, default=None,
+        help="The file from which to extract the baseline used for the calculation of the speedup."
+             "In case there are runs with different numbers of threads, only thread==1 "
+             "runs are considered")
 
-parser.add_argument("-m", "--spread-measures", type=str,
-    default="mad",
-    help="One or more comma-separated measure of dispersion. Available: "
-         "X-percentile (pX), "
-         "X standard deviations (stdX), "
-         "Robust standard deviations (rstdX), "
-         "Median absolute deviation (mad). "
-         "Min-max range (range), "
-         "Interquartile range (iqr), "
-         "E.g: -m p90,p95. "
-         "Default is 'mad'.")
+    parser.add_argument("-m", "--spread-measures", type=str,
+        default="mad",
+        help="One or more comma-separated measure of dispersion. Available: "
+             "X-percentile (pX), "
+             "X standard deviations (stdX), "
+             "Robust standard deviations (rstdX), "
+             "Median absolute deviation (mad). "
+             "Min-max range (range), "
+             "Interquartile range (iqr), "
+             "E.g: -m p90,p95. "
+             "Default is 'mad'.")
 
-parser.add_argument("-X", "--xlim", metavar="NUM", type=float, default=None,
-    help="Set a limit for the X axis on the speedup plot")
+    parser.add_argument("-X", "--xlim", metavar="NUM", type=float, default=None,
+        help="Set a limit for the X axis on the speedup plot")
 
-parser.add_argument("-Y", "--ylim", metavar="NUM", type=float, default=None,
-    help="Set a limit for the Y axis on the speedup plot")
+    parser.add_argument("-Y", "--ylim", metavar="NUM", type=float, default=None,
+        help="Set a limit for the Y axis on the speedup plot")
 
-parser.add_argument("--ci-style", type=str, choices=["area", "bar"], default="area",
-    help="Style to use for plotting confidence intervals. Default is 'area'")
+    parser.add_argument("--ci-style", type=str, choices=["area", "bar"], default="area",
+        help="Style to use for plotting confidence intervals. Default is 'area'")
 
-parser.add_argument("--hide-plot", type=str, choices=["speedup", "time"], default=None,
-    help="Hide a plot")
+    parser.add_argument("--hide-plot", type=str, choices=["speedup", "time"], default=None,
+        help="Hide a plot")
 
-parser.add_argument("--hide-peaks", action="store_true",
-    help="Hide the horizontal and vertical lines related to maximum speed "
-          "and minimum execution time")
+    parser.add_argument("--hide-peaks", action="store_true",
+        help="Hide the horizontal and vertical lines related to maximum speed "
+              "and minimum execution time")
 
-parser.add_argument("--loglog-time", action="store_true", default=False,
-    help="Time plot using log-log axis")
+    parser.add_argument("--loglog-time", action="store_true", default=False,
+        help="Time plot using log-log axis")
 
-parser.add_argument("--amdahl", action="store_true",
-    help="Attempt to fit Amdahl's law to the speedup plot")
+    parser.add_argument("--amdahl", action="store_true",
+        help="Attempt to fit Amdahl's law to the speedup plot. Same as --models amdahl")
 
-parser.add_argument("--boundaries", action="store_true", default=False,
-    help="Draw min-max boundaries around each line")
+    parser.add_argument("--models", type=str, default="",
+        help="One or more comma-separated scalability models to fit to the speedup plot "
+             "and report with standard errors and peak thread count. Available: "
+             "amdahl, gustafson, usl (Gunther's Universal Scalability Law). "
+             "E.g.: --models amdahl,usl")
 
-parser.add_argument("--attitude", type=str, choices=["fair", "pessimistic"], default="fair",
-    help="'fair' and 'pessimistic' use 'median' and 'min' for computing a baseline from multiple "
-         "runs. Default is 'pessimistic'")
+    parser.add_argument("--extrapolate", metavar="T", type=int, default=None,
+        help="Draw the fitted models up to T threads and report their predicted speedup at T")
 
-parser.add_argument("-n", "--names", type=str, 
-    help="Rename programs in the plot legend. ;-separated list")
+    parser.add_argument("--diagnostics", action="store_true",
+        help="Add a third plot with the parallel efficiency, the Karp-Flatt metric "
+             "(experimentally determined serial fraction) and the marginal speedup "
+             "per added thread")
 
-parser.add_argument("-t", "--title", type=str, default="",
-    help="Figure title")
+    parser.add_argument("--diagnostics-csv", metavar="FILENAME", type=str, default=None,
+        help="Save the speedup, efficiency, Karp-Flatt metric and marginal speedup of "
+             "every input and number of threads to a CSV file")
 
-parser.add_argument("-o", "--output", metavar="FILENAME", type=str,
-    help="Save figure to a file in different formats. "
-         "E.g.: a.pdf, a.svg, a.png, a.jpg")
+    parser.add_argument("--min-efficiency", metavar="NUM", type=float, default=0.5,
+        help="Efficiency below which extra threads are considered not worth it. The "
+             "largest thread count above it is reported for each input. Default is 0.5")
 
-preferred_colors = ["#5588dd", "#882255", "#33bb88", "#ddcc77",
-                    "#cc6677", "#999933", "#aa44ff", "#448811",
-                    "#3fa7d6", "#e94f37", "#6cc551", "#dabef9"]
-preferred_color = iter(preferred_colors)
-name_sep = "::"
+    parser.add_argument("--boundaries", action="store_true", default=False,
+        help="Draw min-max boundaries around each line")
 
-args = parser.parse_args()
+    parser.add_argument("--attitude", type=str, choices=["fair", "pessimistic"], default="fair",
+        help="'fair' and 'pessimistic' use 'median' and 'min' for computing a baseline from multiple "
+             "runs. Default is 'pessimistic'")
 
-if args.names is not None:
-    if len(args.names.split(";")) != len(args.filenames):
-        print("ERROR: the number of input files and names do not match")
-        sys.exit(1)
-    name_it = iter(args.names.split(";"))
+    parser.add_argument("--bootstrap", metavar="B", type=int, default=0,
+        help="Draw bootstrap confidence intervals of the speedup from B resamples of "
+             "both the baseline and each thread count, instead of the spread measures. "
+             "E.g.: --bootstrap 10000")
 
-spread_measures = args.spread_measures.split(",")
+    parser.add_argument("--confidence", metavar="LEVEL", type=float, default=0.95,
+        help="Confidence level of --bootstrap. Default is 0.95")
 
+    parser.add_argument("--seed", metavar="NUM", type=int, default=None,
+        help="Seed of the random generator used by --bootstrap")
 
-fig = plt.figure(constrained_layout=True)
+    parser.add_argument("-n", "--names", type=str,
+        help="Rename programs in the plot legend. ;-separated list")
 
-if args.hide_plot is None:
-    gs = gridspec.GridSpec(1, 2, figure=fig)
-    s_plot = fig.add_subplot(gs[0, 0])
-    t_plot = fig.add_subplot(gs[0, 1])
-else:
-    gs = gridspec.GridSpec(1, 1, figure=fig)
-    s_plot = fig.add_subplot(gs[0, 0])
-    t_plot = fig.add_subplot(gs[0, 0])
+    parser.add_argument("-t", "--title", type=str, default="",
+        help="Figure title")
 
-if args.hide_plot == "speedup":
-    s_plot.set_visible(False)
-elif args.hide_plot == "time":
-    t_plot.set_visible(False)
+    parser.add_argument("--sketch-threshold", metavar="ROWS", type=int, default=1000000,
+        help="Inputs with more rows than this are summarized with quantile sketches, in "
+             "near-linear time (quantile rank error < 0.2%%). The plots of single inputs "
+             "then read them in chunks from the binary cache, in bounded memory, and "
+             "cannot use --bootstrap; --keys, --follow and compare still load them in "
+             "memory. 0 disables sketches. Default is 1000000")
 
-axs = [s_plot, t_plot]
-plt.style.use("bmh")
+    parser.add_argument("--no-cache", action="store_true",
+        help="Parse the CSV files again instead of using the binary cache "
+             "(stored in $QPLOT_CACHE, default is ~/.cache/qplot)")
 
-min_thread_num = None
-max_thread_num = None
+    parser.add_argument("-o", "--output", metavar="FILENAME", type=str,
+        help="Save figure to a file in different formats. "
+             "E.g.: a.pdf, a.svg, a.png, a.jpg")
 
-# handling baseline
-if args.baseline is not None:
-    df = pandas.read_csv(args.baseline)
-    df = df.dropna()
-    if args.unit == "s":
-        df["time"] /= 1000
-    if args.xlim is not None:
-        df = df[df["threads"] <= int(args.xlim)]
+    parser.add_argument("-k", "--keys", type=str, default=None,
+        help="Comma-separated extra key columns of a multi-dimensional sweep "
+             "(e.g. size,affinity). Each combination of input and key values is a "
+             "separate configuration, and the plot becomes a grid of facets")
 
-    color = preferred_colors[len(args.filenames)]
-    baseline_times = df.groupby("threads")["time"].median()
-    min_thread_num = df["threads"].min()
+    parser.add_argument("--rows", metavar="KEY", type=str, default=None,
+        help="Key spread over the rows of the facet grid. Default is the second key")
 
-    if args.attitude == "fair":
-        baseline_time = df.groupby("threads")["time"].median()[min_thread_num]
-    elif args.attitude == "pessimistic":
-        baseline_time = df.groupby("threads")["time"].min()[min_thread_num]
+    parser.add_argument("--cols", metavar="KEY", type=str, default=None,
+        help="Key spread over the columns of the facet grid. Default is the first key")
 
-    # confidence intervals for the baseline (time plot)
-    spread.draw(t_plot, spread_measures, x, df.groupby("threads")["time"][min_thread_num], color, args.ci_style)
+    parser.add_argument("--follow", action="store_true",
+        help="Keep reading the input files while they grow (e.g. during a makebm "
+             "campaign) and update the plots incrementally. With -o, the figure is "
+             "saved again at every update")
 
-    # for i, sm in enumerate(spread_measures):
-    #     y_lower = spread.lower(df.groupby("threads")["time"], sm)[:min_thread_num]
-    #     y_upper = spread.upper(df.groupby("threads")["time"], sm)[:min_thread_num]
-    #     draw_bar_interval(t_plot, [min_thread_num], y_lower, y_upper, alphas[i])
+    parser.add_argument("--interval", metavar="SEC", type=float, default=1.0,
+        help="Polling interval of --follow in seconds. Default is 1")
 
-    print("Reference time = {:.1f} {}".format(baseline_time, args.unit))
+    parser.add_argument("--batch", metavar="DIR", type=str, default=None,
+        help="Render every campaign in DIR to a file, without showing any window. "
+             "A campaign is either a CSV file or a subdirectory whose CSV files are "
+             "plotted together. All the other options apply to every campaign")
 
-max_x = 1
+    parser.add_argument("--outdir", metavar="DIR", type=str, default=".",
+        help="Output directory of --batch. A 'summary.csv' is written there too. "
+             "Default is '.'")
 
-names = []
-dfs = []
+    parser.add_argument("--format", type=str, default="png",
+        help="File format of the figures rendered by --batch. Default is 'png'")
 
-for filename in args.filenames:
-    name = filename.rsplit(".", 1)[0].split("/")[-1] if args.names is None else next(name_it)
-    names.append(name)
-    df = pandas.read_csv(filename)
-    dfs.append(df)
+    parser.add_argument("-j", "--jobs", metavar="NUM", type=int, default=None,
+        help="Number of worker processes for --batch and of threads for --bootstrap. "
+             "Default is the number of cores")
 
-for name, df in zip(names, dfs):
-    df = df.dropna()
+    return parser
 
-    if args.unit == "s":
+# ===== COMPUTATION =====================================================================
+
+def load(filename, unit="s", xlim=None, use_cache=True, keys=()):
+    """Read a CSV file produced by makebm, converting the time to 'unit'"""
+    df = csvcache.load(filename, use_cache=use_cache, columns=keys)
+    if unit == "s":
         df["time"] /= 1000
-    if args.xlim is not None:
-        df = df[df["threads"] <= int(args.xlim)]
-
-    median_times = df.groupby("threads")["time"].median()
-
-    # ===== SPEEDUP PLOT ================================================================
-
-    max_thread_num = max(max_thread_num or 0, df["threads"].max())
-    n = df["threads"].min()
-    min_thread_num = min(min_thread_num or 2**30, n)
-    if min_thread_num != n:
-        print("The minumum number of threads in each file should be the same "
-              "when no explicit baseline is specified.\n"
-              f"Found two experiments with min thread num equal to {min_thread_num} "
-              f"and {n} respectively.")
-        sys.exit(1)
-
-    if args.baseline is None:
-        if args.attitude == "fair":
-            baseline_time = df.groupby("threads")["time"].median()[n]
-        elif args.attitude == "pessimistic":
-            baseline_time = df.groupby("threads")["time"].min()[n]
-
-    speedup = baseline_time / median_times
-    x = median_times.index.to_numpy(dtype=int)
-    time = median_times.values
-
-    if args.baseline is None:
-        # for the case of self speedup (i.e. no explicit baseline) it would be 
+    if xlim is not None:
+        df = df[df["threads"] <= int(xlim)]
+    return df
+
+class Large:
+    """Input with more rows than --sketch-threshold, never loaded as a frame: its
+    binary cache entry (see csvcache) is read one chunk at a time into quantile
+    sketches (see spread.stream_sketches). Indexing it by 'threads' gives the column
+    of the memory-mapped array, for the thread counts"""
+    def __init__(self, data, unit="s", xlim=None):
+        if xlim is not None:
+            data = data[:numpy.searchsorted(data["threads"], int(xlim), side="right")]
+        self.data = data
+        self.scale = 1000.0 if unit == "s" else 1.0
+        self.time_sketches = self.sketches()
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, column):
+        return self.data[column]
+
+    def sketches(self, transform=None):
+        """{(threads,): KLL sketch of the time, mapped by 'transform'}"""
+        def convert(t):
+            t = t / self.scale
+            return t if transform is None else transform(t)
+        return spread.stream_sketches(self.data, "threads", "time", convert)
+
+def load_input(filename, unit="s", xlim=None, use_cache=True, sketch_threshold=None):
+    """load() or, above 'sketch_threshold' rows, a Large input"""
+    if sketch_threshold:
+        data = csvcache.load_array(filename, use_cache)
+        if len(data) > sketch_threshold:
+            return Large(data, unit, xlim)
+    return load(filename, unit, xlim, use_cache)
+
+def reference_time(df, attitude="fair"):
+    """Time of the runs with the lowest number of threads: the median for a 'fair'
+    attitude and the minimum for a 'pessimistic' one"""
+    if isinstance(df, Large):
+        return sketch_reference(df.time_sketches, attitude)
+    times = df.loc[df["threads"] == df["threads"].min(), "time"]
+    if attitude == "fair":
+        return times.median()
+    elif attitude == "pessimistic":
+        return times.min()
+
+def sketch_reference(sketches, attitude="fair"):
+    """reference_time() of a {threads: KLL} dictionary"""
+    lowest = sketches[min(sketches)]
+    return lowest.median() if attitude == "fair" else lowest.min
+
+def curve(df, spread_measures=("mad",), baseline_time=None, attitude="fair",
+          sketch_threshold=None):
+    """Median time and speedup for each number of threads of a single input.
+
+    Without a 'baseline_time' the speedup is relative to the input itself.
+    Returns the curve (columns 'threads', 'time' and 'speedup'), the spread statistics
+    of the time (see spread.compute) and the baseline time that was used."""
+    if isinstance(df, Large):
+        time_stats = spread.sketch_stats(df.time_sketches, ["threads"], spread_measures)
+    else:
+        time_stats = spread.compute(df, "threads", "time", spread_measures,
+                                    sketch_threshold=sketch_threshold)
+    median_times = time_stats.drop_duplicates("threads")
+
+    self_speedup = baseline_time is None
+    if self_speedup:
+        baseline_time = reference_time(df, attitude)
+
+    c = pandas.DataFrame({
+        "threads": median_times["threads"].to_numpy(dtype=int),
+        "time": median_times["median"].to_numpy(copy=True)})
+    c["speedup"] = baseline_time / c["time"]
+
+    if self_speedup:
+        # for the case of self speedup (i.e. no explicit baseline) it would be
         # counterintuitive to not have the speedup plot starting at 1 and the time
         # plot starting from the baseline time
-        speedup[min_thread_num] = 1.0
-        time[0] = baseline_time
+        c.loc[0, "speedup"] = 1.0
+        c.loc[0, "time"] = baseline_time
+
+    return c, time_stats, baseline_time
+
+def compute(dfs, names, baseline_df=None, attitude="fair", spread_measures=("mad",),
+            sketch_threshold=None):
+    """Curves of all the inputs. Returns {name: (curve, time_stats, baseline_time)}"""
+    baseline_time = None
+    if baseline_df is not None:
+        baseline_time = reference_time(baseline_df, attitude)
+    else:
+        min_threads = {df["threads"].min() for df in dfs}
+        if len(min_threads) > 1:
+            a, b = sorted(min_threads)[:2]
+            raise ValueError(
+                "The minumum number of threads in each file should be the same "
+                "when no explicit baseline is specified.\n"
+                f"Found two experiments with min thread num equal to {a} and {b} "
+                "respectively.")
+
+    return {name: curve(df, spread_measures, baseline_time, attitude, sketch_threshold)
+            for name, df in zip(names, dfs)}
+
+def curve_table(results):
+    """Curves of all the inputs in one long frame with a 'name' column"""
+    return pandas.concat([c.assign(name=name) for name, (c, _, _) in results.items()],
+                         ignore_index=True)
+
+def speedup_curves(results):
+    return {name: (c["threads"], c["speedup"]) for name, (c, _, _) in results.items()}
+
+def fit_models(results, models=("amdahl", "gustafson", "usl")):
+    """Scalability models fitted to the speedup of every input (see scalability.fit_all)"""
+    return scalability.fit_all(speedup_curves(results), models)
+
+def diagnostics(curves, by="name"):
+    """Parallel efficiency, Karp-Flatt metric and marginal speedup of speedup curves.
+
+    'curves' is a long frame with the column(s) 'by', 'threads' and 'speedup'. The
+    number of processors p is counted relative to the lowest thread count of each
+    curve: the efficiency is S/p and the Karp-Flatt metric, i.e. the experimentally
+    determined serial fraction, is (1/S - 1/p) / (1 - 1/p) (undefined for p = 1).
+    The marginal speedup is the speedup gained per thread added since the previous
+    thread count."""
+    by = [by] if isinstance(by, str) else list(by)
+    d = curves[by + ["threads", "speedup"]].sort_values(by + ["threads"], kind="stable")
+    d = d.reset_index(drop=True)
+    g = d.groupby(by, sort=False)
+    p = d["threads"] / g["threads"].transform("min")
+    d["efficiency"] = d["speedup"] / p
+    d["karp_flatt"] = ((1 / d["speedup"] - 1 / p) / (1 - 1 / p)).where(p > 1)
+    d["marginal_speedup"] = g["speedup"].diff() / g["threads"].diff()
+    return d
+
+def efficient_threads(diag, by="name", min_efficiency=0.5):
+    """Largest thread count of each curve whose efficiency is at least 'min_efficiency'"""
+    return diag[diag["efficiency"] >= min_efficiency].groupby(by)["threads"].max()
+
+def summarize(results, min_efficiency=0.5):
+    """One row per input: maximum speedup and where it is reached, minimum time and
+    where it is reached, the serial fraction of the Amdahl's law fit and the largest
+    thread count with an efficiency of at least 'min_efficiency'"""
+    amdahl = scalability.fit(speedup_curves(results), "amdahl")
+    efficient = efficient_threads(diagnostics(curve_table(results)), "name", min_efficiency)
+    rows = []
+    for name, (c, _, _) in results.items():
+        imax = c["speedup"].idxmax()
+        imin = c["time"].idxmin()
+        rows.append({
+            "name": name,
+            "max_speedup": c.loc[imax, "speedup"],
+            "max_speedup_T": c.loc[imax, "threads"],
+            "min_time": c.loc[imin, "time"],
+            "min_time_T": c.loc[imin, "threads"],
+            "serial_fraction": amdahl.loc[name, "serial"],
+            "efficient_T": efficient.get(name, numpy.nan),
+        })
+    return pandas.DataFrame(rows).set_index("name")
+
+def bootstrap_speedup(dfs, names, baseline_df=None, attitude="fair", B=10000,
+                      confidence=0.95, seed=None, jobs=None):
+    """Bootstrap confidence intervals of the median speedup for each input and number
+    of threads. The baseline (explicit or the lowest thread count of each input) is
+    resampled together with the runs, and the lowest thread count of a self-speedup
+    shares the resamples of its baseline. Returns a frame with the columns 'name',
+    'threads', 'lower' and 'upper'"""
+    baseline_statistic = {"fair": "median", "pessimistic": "min"}[attitude]
+
+    def baseline_runs(df):
+        return df.loc[df["threads"] == df["threads"].min(), "time"].to_numpy()
+
+    if baseline_df is not None:
+        numerators = {None: baseline_runs(baseline_df)}
+    else:
+        numerators = {name: baseline_runs(df) for name, df in zip(names, dfs)}
+
+    groups = {}
+    for name, df in zip(names, dfs):
+        num_key = None if baseline_df is not None else name
+        for threads, times in df.groupby("threads")["time"]:
+            # the lowest thread count of a self-speedup is its own baseline
+            itself = baseline_df is None and threads == df["threads"].min()
+            groups[(name, threads)] = (num_key, None if itself else times.to_numpy())
+
+    ci = bootstrap.ratio_ci(numerators, groups, B, confidence,
+                            numerator_statistic=baseline_statistic, seed=seed, jobs=jobs)
+    return pandas.DataFrame([(name, threads, lo, hi) for (name, threads), (lo, hi) in ci.items()],
+                            columns=["name", "threads", "lower", "upper"])
+
+def default_names(filenames):
+    return [f.rsplit(".", 1)[0].split("/")[-1] for f in filenames]
 
-    label = "{} {} max={:.1f}x @ T={}".format(name, name_sep, max(speedup), speedup.idxmax())
+def analyze(filenames, names=None, baseline=None, unit="s", xlim=None, attitude="fair",
+            spread_measures=("mad",), use_cache=True, min_efficiency=0.5):
+    """Summary DataFrame of a set of CSV files (see summarize)"""
+    names = names or default_names(filenames)
+    dfs = [load(f, unit, xlim, use_cache) for f in filenames]
+    baseline_df = None if baseline is None else load(baseline, unit, xlim, use_cache)
+    return summarize(compute(dfs, names, baseline_df, attitude, spread_measures),
+                     min_efficiency)
 
+# ===== MULTI-DIMENSIONAL SWEEPS ========================================================
+#
+# Besides 'threads', a campaign can sweep other parameters (input size, affinity,
+# allocator...) stored as extra key columns. All the inputs are concatenated in one
+# long table and a configuration is identified by the input name and the key values.
+
+def load_table(filenames, names, keys, unit="s", xlim=None, use_cache=True):
+    """Long-format table of all the inputs: columns 'name', keys, 'threads' and 'time'"""
+    dfs = [load(f, unit, xlim, use_cache, keys).assign(name=name)
+           for f, name in zip(filenames, names)]
+    return pandas.concat(dfs, ignore_index=True)[["name"] + list(keys) + ["threads", "time"]]
+
+def sweep(table, keys, spread_measures=("mad",), baseline_time=None, attitude="fair",
+          sketch_threshold=None):
+    """Curves of every configuration of a long table, computed in one grouped pass.
+
+    Without a 'baseline_time' each configuration is relative to its lowest thread count.
+    Returns the curves (columns 'name', keys, 'threads', 'time' and 'speedup') and the
+    spread statistics of the time and of the speedup (see spread.compute)."""
+    series = ["name"] + list(keys)
+    time_stats = spread.compute(table, "threads", "time", spread_measures, z=series,
+                                sketch_threshold=sketch_threshold)
+    curves = time_stats.drop_duplicates(series + ["threads"])
+    curves = curves[series + ["threads", "median"]].rename(columns={"median": "time"})
+    curves = curves.reset_index(drop=True)
+
+    if baseline_time is None:
+        first = table["threads"] == table.groupby(series)["threads"].transform("min")
+        statistic = {"fair": "median", "pessimistic": "min"}[attitude]
+        reference = table[first].groupby(series)["time"].agg(statistic).rename("reference")
+        curves = curves.join(reference, on=series)
+        table_reference = table.join(reference, on=series)["reference"]
+        # same convention as curve(): speedup 1 and baseline time at the lowest T
+        first = curves["threads"] == curves.groupby(series)["threads"].transform("min")
+        curves.loc[first, "time"] = curves.loc[first, "reference"]
+    else:
+        curves["reference"] = baseline_time
+        table_reference = baseline_time
+
+    curves["speedup"] = curves["reference"] / curves["time"]
+    speedup_stats = spread.compute(table.assign(time=table_reference / table["time"]),
+                                   "threads", "time", spread_measures, z=series,
+                                   sketch_threshold=sketch_threshold)
+    return curves.drop(columns="reference"), time_stats, speedup_stats
+
+def summarize_sweep(curves, keys, min_efficiency=0.5):
+    """Same as summarize(), with one row per configuration"""
+    series = ["name"] + list(keys)
+    imax = curves.groupby(series)["speedup"].idxmax()
+    imin = curves.groupby(series)["time"].idxmin()
+    summary = pandas.DataFrame({
+        "max_speedup": curves.loc[imax, "speedup"].to_numpy(),
+        "max_speedup_T": curves.loc[imax, "threads"].to_numpy(),
+        "min_time": curves.loc[imin, "time"].to_numpy(),
+        "min_time_T": curves.loc[imin, "threads"].to_numpy(),
+    }, index=imax.index)
+    amdahl = scalability.fit({key: (c["threads"], c["speedup"])
+                              for key, c in curves.groupby(series)}, "amdahl")
+    summary["serial_fraction"] = amdahl["serial"].to_numpy()
+    efficient = efficient_threads(diagnostics(curves, series), series, min_efficiency)
+    summary["efficient_T"] = efficient.reindex(summary.index)
+    return summary
+
+def facets(keys, rows=None, cols=None):
+    """Keys used for the rows and the columns of the facet grid. By default the first
+    key is spread over the columns and the second one over the rows"""
+    free = [k for k in keys if k not in (rows, cols)]
+    if cols is None and free:
+        cols = free.pop(0)
+    if rows is None and free:
+        rows = free.pop(0)
+    return rows, cols
+
+def config_label(names, values):
+    return " ".join("{}={}".format(n, v) if n != "name" else str(v)
+                    for n, v in zip(names, values))
+
+# ===== PLOTTING ========================================================================
+
+def threads_label(T):
+    return "-" if pandas.isna(T) else str(int(T))
+
+def peak_label(fit):
+    """Peak of a fitted model, or its asymptote when the curve has no peak"""
+    if numpy.isfinite(fit["peak_T"]):
+        return "peak = {:.1f}x @ T={:.0f}".format(fit["peak_speedup"], fit["peak_T"])
+    if numpy.isfinite(fit["peak_speedup"]):
+        return "no peak, limit = {:.1f}x".format(fit["peak_speedup"])
+    return "no peak"
+
+def model_label(model, fit):
+    if model == "amdahl":
+        return "Amdahl's law, serial={:.1f}%".format(100*fit["serial"])
+    elif model == "gustafson":
+        return "Gustafson's law, serial={:.1f}%".format(100*fit["serial"])
+    elif model == "usl":
+        peak = ("peak @ T={:.0f}".format(fit["peak_T"]) if numpy.isfinite(fit["peak_T"])
+                else "no peak")
+        return "USL, \u03c3={:.3f} \u03ba={:.5f}, {}".format(
+            fit["contention"], fit["coherency"], peak)
+
+def print_fits(fits, extrapolate=None):
+    """Print the fitted models to the terminal, one line per input and model"""
+    padding = max(len(str(n)) for n, _ in fits.index) + 1
+    for (name, model), fit in fits.iterrows():
+        params = scalability.models[model][1]
+        values = "  ".join("{} = {:.4g} \u00b1 {:.2g}".format(p, fit[p], fit[p + "_err"])
+                           for p in params)
+        line = "{:{padding}}: {:9} {}  rmse = {:.3f}  {}".format(
+            name, model, values, fit["rmse"], peak_label(fit), padding=padding)
+        if extrapolate is not None:
+            predicted = scalability.predict(fits.loc[[(name, model)]], extrapolate)
+            line += "  S({}) = {:.1f}x".format(extrapolate, predicted.iloc[0, 0])
+        print(line)
+
+def input_names(args):
+    if args.names is not None:
+        names = args.names.split(";")
+        if len(names) != len(args.filenames):
+            raise ValueError("the number of input files and names do not match")
+        return names
+    return default_names(args.filenames)
+
+def make_figure(args):
+    """Figure with the speedup, the time and the optional diagnostics plots.
+    The diagnostics plot is None unless it was requested"""
+    fig = plt.figure(constrained_layout=True)
+    columns = (1 if args.hide_plot is None else 0) + (1 if args.diagnostics else 0) + 1
+    gs = gridspec.GridSpec(1, columns, figure=fig)
+
+    if args.hide_plot is None:
+        s_plot = fig.add_subplot(gs[0, 0])
+        t_plot = fig.add_subplot(gs[0, 1])
+    else:
+        s_plot = fig.add_subplot(gs[0, 0])
+        t_plot = fig.add_subplot(gs[0, 0])
+
+    if args.hide_plot == "speedup":
+        s_plot.set_visible(False)
+    elif args.hide_plot == "time":
+        t_plot.set_visible(False)
+
+    d_plot = fig.add_subplot(gs[0, columns - 1]) if args.diagnostics else None
+
+    plt.style.use("bmh")
+    return fig, s_plot, t_plot, d_plot
+
+def draw_diagnostics(ax, diag, colors, min_efficiency=0.5):
+    """Efficiency (solid), Karp-Flatt metric (dashed) and marginal speedup (dotted) of
+    every input, with the efficiency threshold as a horizontal line"""
+    for name, d in diag.groupby("name", sort=False):
+        color = colors[name]
+        ax.plot(d["threads"], d["efficiency"], ".-", color=color,
+                label="{} {} efficiency".format(name, name_sep))
+        ax.plot(d["threads"], d["karp_flatt"], "--", color=color,
+                label="{} {} Karp-Flatt".format(name, name_sep))
+        ax.plot(d["threads"], d["marginal_speedup"], ":", color=color,
+                label="{} {} marginal speedup".format(name, name_sep))
+    ax.axhline(y=min_efficiency, linestyle="-", linewidth=1, color="lightgray")
+    ax.set_xlabel("Number of threads (T)")
+    ax.set_ylabel("Efficiency, serial fraction, speedup per added thread")
+    ax.set_ylim(bottom=min(0.0, diag["marginal_speedup"].min()), top=1.1)
+    ax.grid(True)
+    ax.legend(fontsize="small")
+
+def sweep_unsupported(args):
+    """Options given on the command line that a --keys sweep would ignore"""
+    options = [("--models", args.models), ("--amdahl", args.amdahl),
+               ("--extrapolate", args.extrapolate is not None),
+               ("--bootstrap", args.bootstrap), ("--boundaries", args.boundaries),
+               ("--loglog-time", args.loglog_time), ("--hide-peaks", args.hide_peaks),
+               ("--diagnostics", args.diagnostics)]
+    return [option for option, given in options if given]
+
+def render_sweep(args, verbose=True):
+    """Facet grid of a multi-dimensional sweep: one speedup (or time) plot per value of
+    the row and column keys, one line per remaining configuration"""
+    unsupported = sweep_unsupported(args)
+    if unsupported:
+        raise ValueError("--keys does not support {}".format(", ".join(unsupported)))
+    keys = args.keys.split(",")
+    for k in (args.rows, args.cols):
+        if k is not None and k not in keys:
+            raise ValueError("facet key '{}' is not one of --keys".format(k))
+    names = input_names(args)
+    spread_measures = args.spread_measures.split(",")
+    use_cache = not args.no_cache
+
+    table = load_table(args.filenames, names, keys, args.unit, args.xlim, use_cache)
+    baseline_time = None
+    if args.baseline is not None:
+        baseline_df = load(args.baseline, args.unit, args.xlim, use_cache)
+        baseline_time = reference_time(baseline_df, args.attitude)
+    curves, time_stats, speedup_stats = sweep(table, keys, spread_measures, baseline_time,
+                                              args.attitude, args.sketch_threshold)
+    summary = summarize_sweep(curves, keys, args.min_efficiency)
+    if args.diagnostics_csv is not None:
+        diagnostics(curves, ["name"] + keys).to_csv(args.diagnostics_csv, index=False)
+        if verbose:
+            print("Saved diagnostics to {}".format(args.diagnostics_csv))
+
+    rows, cols = facets(keys, args.rows, args.cols)
+    row_values = sorted(curves[rows].unique()) if rows else [None]
+    col_values = sorted(curves[cols].unique()) if cols else [None]
+    series = ["name"] + keys
+    lines = [k for k in series if k not in (rows, cols)]
+    if len(names) == 1 and len(lines) > 1:
+        lines.remove("name")
+    line_values = curves[lines].drop_duplicates().itertuples(index=False, name=None)
+    colors = {v: preferred_colors[i % len(preferred_colors)] for i, v in enumerate(line_values)}
+
+    show_time = args.hide_plot == "speedup"
+    y, stats = ("time", time_stats) if show_time else ("speedup", speedup_stats)
+
+    fig, axes = plt.subplots(len(row_values), len(col_values), squeeze=False,
+                             sharex=True, sharey=True, constrained_layout=True)
+    plt.style.use("bmh")
+
+    for i, row_value in enumerate(row_values):
+        for j, col_value in enumerate(col_values):
+            ax = axes[i][j]
+            mask = pandas.Series(True, index=curves.index)
+            stats_mask = pandas.Series(True, index=stats.index)
+            title = []
+            for k, v in ((rows, row_value), (cols, col_value)):
+                if k is not None:
+                    mask &= curves[k] == v
+                    stats_mask &= stats[k] == v
+                    title.append("{}={}".format(k, v))
+            ax.set_title(", ".join(title))
+
+            for line_value, c in curves[mask].groupby(lines, sort=False):
+                color = colors[line_value]
+                label = config_label(lines, line_value)
+                ax.plot(c["threads"], c[y], ".-", color=color, label=label)
+                s = stats[stats_mask]
+                for k, v in zip(lines, line_value):
+                    s = s[s[k] == v]
+                spread.draw(ax, spread_measures, s, "threads", "median", colors=[color],
+                            style=args.ci_style, stats=s)
+
+            ax.grid(True)
+            if i == len(row_values) - 1:
+                ax.set_xlabel("Number of threads (T)")
+            if j == 0:
+                ax.set_ylabel("Execution time [{}]".format(args.unit) if show_time else "Speedup")
+            ax.legend(fontsize="small")
+
+    for ax in axes.flat:
+        if not show_time:
+            xmax = curves["threads"].max()
+            ax.plot([1, xmax], [1, xmax], linestyle="--", color="lightgray")
+            finite = curves["speedup"][numpy.isfinite(curves["speedup"])]
+            ax.set_ylim(top=1.1 * finite.max() if len(finite) else xmax)
+        ax.set_ylim(bottom=0.0)
+        if args.xlim is not None:
+            ax.set_xlim(right=args.xlim)
+        if args.ylim is not None and not show_time:
+            ax.set_ylim(top=args.ylim)
+
+    fig.suptitle(args.title)
+    fig.set_size_inches(min(6 * len(col_values), 30), min(5 * len(row_values), 25))
+
+    if verbose:
+        labels = [config_label(series, key) for key in summary.index]
+        padding = max(len(l) for l in labels) + 1
+        for label, (_, row) in zip(labels, summary.iterrows()):
+            print("{:{padding}}: max speedup = {:.1f}x ({:.1f} {}) @ T={}, efficient up to T={}"
+                  .format(label, row["max_speedup"], row["min_time"], args.unit,
+                          int(row["max_speedup_T"]), threads_label(row["efficient_T"]),
+                          padding=padding))
+
+    return fig, summary
+
+def render(args, verbose=True):
+    """Draw the speedup and time plots described by the command line arguments.
+    Returns the figure and the summary DataFrame"""
+    if args.keys:
+        return render_sweep(args, verbose)
+
+    names = input_names(args)
+    spread_measures = args.spread_measures.split(",")
+    use_cache = not args.no_cache
+    preferred_color = iter(preferred_colors)
+
+    fig, s_plot, t_plot, d_plot = make_figure(args)
+
+    dfs = [load_input(f, args.unit, args.xlim, use_cache, args.sketch_threshold)
+           for f in args.filenames]
+    baseline_df = None
     if args.baseline is not None:
-        if min(speedup) < 1.0:
-            s_plot.axhline(y=1.0, linestyle="-", linewidth=1, color="#00ff00")
+        baseline_df = load_input(args.baseline, args.unit, args.xlim, use_cache,
+                                 args.sketch_threshold)
+    if args.bootstrap > 0 and any(isinstance(df, Large) for df in dfs + [baseline_df]):
+        raise ValueError("--bootstrap resamples every run: it cannot be used with inputs "
+                         "larger than --sketch-threshold")
+
+    results = compute(dfs, names, baseline_df, args.attitude, spread_measures,
+                      args.sketch_threshold)
+    summary = summarize(results, args.min_efficiency)
+    diag = diagnostics(curve_table(results))
+    if args.diagnostics_csv is not None:
+        diag.to_csv(args.diagnostics_csv, index=False)
+        if verbose:
+            print("Saved diagnostics to {}".format(args.diagnostics_csv))
+
+    models = [m for m in args.models.split(",") if m]
+    if args.amdahl and "amdahl" not in models:
+        models.insert(0, "amdahl")
+    unknown = set(models) - set(scalability.models)
+    if unknown:
+        raise ValueError("unknown scalability model(s): {}".format(", ".join(sorted(unknown))))
+    if models:
+        fits = fit_models(results, models)
+        if verbose:
+            print_fits(fits, args.extrapolate)
 
+    if args.bootstrap > 0:
+        speedup_ci = bootstrap_speedup(dfs, names, baseline_df, args.attitude, args.bootstrap,
+                                       args.confidence, args.seed, args.jobs)
+
+    min_thread_num = min(df["threads"].min() for df in dfs)
+    max_thread_num = max(df["threads"].max() for df in dfs)
+
+    # handling baseline
+    if baseline_df is not None:
+        color = preferred_colors[len(args.filenames) % len(preferred_colors)]
+        baseline_threads = baseline_df["threads"].min()
+        min_thread_num = min(min_thread_num, baseline_threads)
+        baseline_time = reference_time(baseline_df, args.attitude)
+
+        # confidence intervals for the baseline (time plot)
+        if isinstance(baseline_df, Large):
+            lowest = {(baseline_threads,): baseline_df.time_sketches[(baseline_threads,)]}
+            spread.draw(t_plot, spread_measures, None, "threads", "time", colors=[color],
+                        style="bar", stats=spread.sketch_stats(lowest, ["threads"],
+                                                               spread_measures))
+        else:
+            spread.draw(t_plot, spread_measures,
+                        baseline_df[baseline_df["threads"] == baseline_threads],
+                        "threads", "time", colors=[color], style="bar")
+
+        if verbose:
+            print("Reference time = {:.1f} {}".format(baseline_time, args.unit))
+
+    padding = max([len(n) for n in names]) + 1
+    colors = {}
+
+    for name, df in zip(names, dfs):
+        c, time_stats, baseline_time = results[name]
+        x = c["threads"].to_numpy()
+        speedup = c.set_index("threads")["speedup"]
+        times = c["time"].to_numpy()
+        row = summary.loc[name]
+        max_speedup_T = int(row["max_speedup_T"])
+        min_time_T = int(row["min_time_T"])
+
+        # ===== SPEEDUP PLOT ============================================================
+
+        label = "{} {} max={:.1f}x @ T={}".format(
+                name, name_sep, row["max_speedup"], max_speedup_T)
+
+        if args.baseline is not None:
+            if min(speedup) < 1.0:
+                s_plot.axhline(y=1.0, linestyle="-", linewidth=1, color="#00ff00")
+
+        color = next(preferred_color)
+        colors[name] = color
+        s_plot.plot(x, speedup, ".-", label=label, color=color)
+
+        # confidence intervals (speedup plot)
+        if args.bootstrap > 0:
+            ci = speedup_ci[speedup_ci["name"] == name]
+            if args.ci_style == "area":
+                s_plot.fill_between(ci["threads"], ci["lower"], ci["upper"],
+                                    interpolate=True, color=color, alpha=0.15)
+            else:
+                s_plot.vlines(x=ci["threads"], ymin=ci["lower"], ymax=ci["upper"],
+                              color=color, alpha=0.30, linewidth=4)
+        elif isinstance(df, Large):
+            # second pass over the input, now that the baseline time is known
+            s_stats = spread.sketch_stats(df.sketches(lambda t: baseline_time / t),
+                                          ["threads"], spread_measures)
+            spread.draw(s_plot, spread_measures, None, "threads", "time",
+                        colors=[color], style=args.ci_style, stats=s_stats)
+        else:
+            s_df = df[["threads", "time"]].assign(time=baseline_time / df["time"])
+            spread.draw(s_plot, spread_measures, s_df, "threads", "time",
+                        colors=[color], style=args.ci_style,
+                        sketch_threshold=args.sketch_threshold)
+
+        # scalability models
+        x_model = numpy.arange(x.min(), max(x.max(), args.extrapolate or 0) + 1)
+        for model, linestyle in zip(models, ["--", "-.", ":"]):
+            fit = fits.loc[(name, model)]
+            func, params = scalability.models[model][:2]
+            s_plot.plot(x_model, func(x_model, *fit[params]), linestyle, color=color, alpha=0.5,
+                        label="{} {} {}".format(name, name_sep, model_label(model, fit)))
+
+        # Boundaries
+        if args.boundaries:
+            if isinstance(df, Large):
+                groups = [g for _, g in sorted(df.time_sketches.items())]
+                mins = numpy.array([g.min for g in groups])
+                maxs = numpy.array([g.max for g in groups])
+            else:
+                mins = df.groupby("threads")["time"].min()
+                maxs = df.groupby("threads")["time"].max()
+            s_plot.plot(x, baseline_time / maxs, linestyle="--", linewidth=1.0, color=color, alpha=0.5)
+            s_plot.plot(x, baseline_time / mins, linestyle="--", linewidth=1.0, color=color, alpha=0.5)
+
+        # ===== TIME PLOT ===============================================================
+
+        label = "{} {} min={:.1f} {} @ T={}".format(
+                name, name_sep, row["min_time"], args.unit, min_time_T)
+        t_plot.plot(x, times, ".-", label=label, color=color)
+
+        # confidence intervals (time plot)
+        spread.draw(t_plot, spread_measures, None, "threads", "time",
+                    colors=[color], style=args.ci_style, stats=time_stats)
+
+        # highlighting highest and lowest peaks
+        if not args.hide_peaks:
+            s_plot.hlines(y=row["max_speedup"], xmin=0, xmax=max_speedup_T,
+                          linestyle="--", linewidth=1, color=color)
+            t_plot.hlines(y=row["min_time"], xmin=0, xmax=min_time_T,
+                          linestyle="--", linewidth=1, color=color)
+
+        # printing a brief summary to the terminal
+        if verbose:
+            print("{:{padding}}: max speedup = {:.1f}x ({:.1f} {}) @ T={}, efficient up to T={}"
+                  .format(name, row["max_speedup"], row["min_time"], args.unit,
+                          max_speedup_T, threads_label(row["efficient_T"]), padding=padding))
+
+    if models and args.extrapolate is not None:
+        max_thread_num = max(max_thread_num, args.extrapolate)
+    max_x = max(1, max_thread_num)
+
+    # finalizing speedup plot
+    xmax = s_plot.get_xlim()[1]
+    ymax = s_plot.get_ylim()[1]
+    x_range = range(2, max_x+1, 2)
+    s_plot.plot([1, xmax], [1, xmax], linestyle="--", color="lightgray")
+    s_plot.set_ylim(top=ymax)
+    s_plot.set_xticks(x_range, x_range, rotation="vertical")
+    s_plot.set_xlabel("Number of threads (T)")
+    s_plot.set_ylabel("Speedup")
+    s_plot.legend()
+    s_plot.set_ylim(bottom=0.0)
+    s_plot.set_xlim(left=min_thread_num-1)
+    s_plot.set_xlim(right=max_thread_num+1)
+    s_plot.grid(True)
+    if args.xlim is not None:
+        s_plot.set_xlim(right=args.xlim)
+    if args.ylim is not None:
+        s_plot.set_ylim(top=args.ylim)
+
+    # finalizing time plot
     color = next(preferred_color)
-    s_plot.plot(x, speedup, ".-", label=label, color=color)
-
-    # confidence intervals (speedup plot)
-    s_df = df[["threads","time"]]
-    s_df["time"] = baseline_time / s_df["time"]
-    spread.draw(s_plot, spread_measures, x, s_df.groupby("threads")["time"], color, args.ci_style)
-
-    # Amdalhs's law interpolation
-    if args.amdahl:
-        amdahls = lambda x, s: 1 / (s + (1 - s) / x)
-        par, _ = scipy.optimize.curve_fit(amdahls, x, speedup)
-        s_plot.plot(x, amdahls(numpy.array(x), par[0]), "--", color=color, alpha=0.5,
-            label="{} {} Amdahl's law, serial={:.1f}%".format(name, name_sep, 100*par[0]))
-    
-    # Boundaries
-    if args.boundaries:
-        mins = df.groupby("threads")["time"].min()
-        maxs = df.groupby("threads")["time"].max()
-        s_plot.plot(x, baseline_time / maxs, linestyle="--", linewidth=1.0, color=color, alpha=0.5)
-        s_plot.plot(x, baseline_time / mins, linestyle="--", linewidth=1.0, color=color, alpha=0.5)
-
-    # ===== TIME PLOT ===================================================================
-
-    label = "{} {} min={:.1f} {} @ T={}".format(
-            name, name_sep, min(time), args.unit, median_times.index[time.argmin()])
-    t_plot.plot(x, time, ".-", label=label, color=color)
-
-    # confidence intervals (time plot)
-    spread.draw(t_plot, spread_measures, x, df.groupby("threads")["time"], color, args.ci_style)
-
-    # highlighting highest and lowest peaks
-    if not args.hide_peaks:
-        s_plot.hlines(y=max(speedup), xmin=0, xmax=speedup.idxmax(),
-                      linestyle="--", linewidth=1, color=color)
-        t_plot.hlines(y=min(time), xmin=0, xmax=median_times.index[time.argmin()],
-                      linestyle="--", linewidth=1, color=color)
-
-    # printing a brief summary to the terminal
-    longest_name = max([len(n) for n in names])
-    padding = longest_name + 1
-    print("{:{padding}}: max speedup = {:.1f}x ({:.1f} {}) @ T={}"
-          .format(name, max(speedup), min(time), args.unit, speedup.idxmax(), padding=padding))
-
-    max_x = max(max_x, df["threads"].max())
-
-# finalizing speedup plot
-xmax = s_plot.get_xlim()[1]
-ymax = s_plot.get_ylim()[1]
-x_range = range(2, max_x+1, 2)
-s_plot.plot([1, xmax], [1, xmax], linestyle="--", color="lightgray")
-s_plot.set_ylim(top=ymax)
-s_plot.set_xticks(x_range, x_range, rotation="vertical")
-s_plot.set_xlabel("Number of threads (T)")
-s_plot.set_ylabel("Speedup")
-s_plot.legend()
-s_plot.set_ylim(bottom=0.0)
-s_plot.set_xlim(left=min_thread_num-1)
-s_plot.set_xlim(right=max_thread_num+1)
-s_plot.grid(True)
-if args.xlim is not None:
-    s_plot.set_xlim(right=args.xlim)
-if args.ylim is not None:
-    s_plot.set_ylim(top=args.ylim)
-
-# finalizing time plot
-color = next(preferred_color)
-t_plot.set_xticks(x_range, x_range, rotation="vertical")
-t_plot.set_xlabel("Number of threads (T)")
-t_plot.set_ylabel("Execution time [{}]".format(args.unit))
-t_plot.legend()
-t_plot.grid(True)
-if args.baseline is not None:
-    t_plot.plot(1, baseline_time, marker="*", linestyle="None", markersize=10, color=color,
-                label="Baseline time = {:.1f} {}".format(baseline_time, args.unit))
-if args.loglog_time:
-    t_plot.set_xscale("log")
-    t_plot.set_yscale("log")
-else:
-    t_plot.set_ylim(bottom=0.0)
-    t_plot.set_xlim(left=min_thread_num-1)
-    t_plot.set_xlim(right=max_thread_num+1)
-if args.xlim is not None:
-    t_plot.set_xlim(right=args.xlim)
-
-# nice title
-fig.suptitle(args.title)
-if args.hide_plot is None:
-    fig.set_size_inches(20, 8)
-else:
-    fig.set_size_inches(10, 8)
-
-# save to file or show
-if args.output is not None:
-    plt.savefig(args.output)
-    print("Saved plot to {}".format(args.output))
-else:
-    plt.show()
+    t_plot.set_xticks(x_range, x_range, rotation="vertical")
+    t_plot.set_xlabel("Number of threads (T)")
+    t_plot.set_ylabel("Execution time [{}]".format(args.unit))
+    t_plot.legend()
+    t_plot.grid(True)
+    if args.baseline is not None:
+        t_plot.plot(1, baseline_time, marker="*", linestyle="None", markersize=10, color=color,
+                    label="Baseline time = {:.1f} {}".format(baseline_time, args.unit))
+    if args.loglog_time:
+        t_plot.set_xscale("log")
+        t_plot.set_yscale("log")
+    else:
+        t_plot.set_ylim(bottom=0.0)
+        t_plot.set_xlim(left=min_thread_num-1)
+        t_plot.set_xlim(right=max_thread_num+1)
+    if args.xlim is not None:
+        t_plot.set_xlim(right=args.xlim)
+
+    # diagnostics plot
+    if d_plot is not None:
+        draw_diagnostics(d_plot, diag, colors, args.min_efficiency)
+        d_plot.set_xticks(x_range, x_range, rotation="vertical")
+        d_plot.set_xlim(left=min_thread_num-1)
+        d_plot.set_xlim(right=max_thread_num+1)
+        if args.xlim is not None:
+            d_plot.set_xlim(right=args.xlim)
+
+    # nice title
+    fig.suptitle(args.title)
+    panels = (2 if args.hide_plot is None else 1) + (1 if d_plot is not None else 0)
+    fig.set_size_inches(10 * panels, 8)
+
+    return fig, summary
+
+# ===== BATCH MODE ======================================================================
+
+def campaigns(directory):
+    """{name: CSV files} for every CSV file and every subdirectory containing CSV files"""
+    found = {}
+    for entry in sorted(pathlib.Path(directory).iterdir()):
+        if entry.is_dir():
+            files = sorted(str(f) for f in entry.glob("*.csv"))
+            if files:
+                found[entry.name] = files
+        elif entry.suffix == ".csv":
+            found[entry.stem] = [str(entry)]
+    return found
+
+def render_campaign(name, filenames, args):
+    """Worker of the batch mode: render a single campaign to a file"""
+    # the workers do not inherit the backend of the parent with the 'spawn' and
+    # 'forkserver' start methods
+    matplotlib.use("Agg")
+    args = argparse.Namespace(**vars(args))
+    args.filenames = filenames
+    args.output = str(pathlib.Path(args.outdir) / f"{name}.{args.format}")
+    if not args.title:
+        args.title = name
+    fig, summary = render(args, verbose=False)
+    fig.savefig(args.output)
+    plt.close(fig)
+    return summary.assign(campaign=name, output=args.output)
+
+def batch(args):
+    """Render all the campaigns of a directory in a pool of processes"""
+    jobs = campaigns(args.batch)
+    if not jobs:
+        raise ValueError(f"no CSV files found in '{args.batch}'")
+    pathlib.Path(args.outdir).mkdir(parents=True, exist_ok=True)
+
+    summaries = []
+    with concurrent.futures.ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        futures = {pool.submit(render_campaign, name, files, args): name
+                   for name, files in jobs.items()}
+        for future in concurrent.futures.as_completed(futures):
+            name = futures[future]
+            try:
+                summaries.append(future.result())
+                print("Saved plot of '{}'".format(name))
+            except Exception as e:
+                print("ERROR: campaign '{}' failed: {}".format(name, e))
+
+    if summaries:
+        summary = pandas.concat(summaries).reset_index()
+        summary = summary.set_index(["campaign", "name"]).sort_index()
+        summary_file = pathlib.Path(args.outdir) / "summary.csv"
+        summary.to_csv(summary_file)
+        print("Saved summary to {}".format(summary_file))
+    return len(summaries) == len(jobs)
+
+# ===== FOLLOW MODE =====================================================================
+#
+# The CSV files are tailed while makebm appends rows to them. Only the new rows are
+# parsed and folded into running aggregates per thread count (count, min, max and a
+# KLL sketch for the median). The lines of the inputs that changed get new data and the
+# figure is redrawn once per poll, only when something changed.
+
+def tail(state):
+    """Parse the rows appended to a CSV file since the previous call.
+    Returns the 'threads' and 'time' values of the new rows"""
+    path = state["path"]
+    if state["file"] is None:
+        if not os.path.exists(path):
+            return [], []
+        state["file"] = open(path)
+    f = state["file"]
+
+    if os.fstat(f.fileno()).st_size < state["pos"]:
+        # the file has been truncated (e.g. a new makebm campaign): start over
+        state.update(pos=0, partial="", columns=None, sketches={})
+
+    f.seek(state["pos"])
+    lines = (state["partial"] + f.read()).split("\n")
+    state["pos"] = f.tell()
+    state["partial"] = lines.pop()
+
+    threads, times = [], []
+    for line in lines:
+        fields = line.strip().split(",")
+        if state["columns"] is None:
+            if not line.strip():
+                continue
+            if "threads" not in fields or "time" not in fields:
+                # not (yet) a makebm CSV file: report it once and read it again from
+                # the start at the next poll, in case it gets rewritten
+                if not state.get("error"):
+                    print("ERROR: '{}' has no 'threads' and 'time' columns, waiting".format(path))
+                state.update(pos=0, partial="", error=True)
+                return [], []
+            state["columns"] = (fields.index("threads"), fields.index("time"))
+            state["error"] = False
+            continue
+        try:
+            t = int(fields[state["columns"][0]])
+            y = float(fields[state["columns"][1]])
+        except (ValueError, IndexError):
+            continue  # e.g. missing time when 'phase' was not found
+        threads.append(t)
+        times.append(y)
+    return threads, times
+
+def aggregates(sketches):
+    """Per-thread count, median, min and max of a {threads: KLL} dictionary"""
+    x = numpy.array(sorted(sketches))
+    return (x,
+            numpy.array([sketches[t].n for t in x]),
+            numpy.array([sketches[t].median() for t in x]),
+            numpy.array([sketches[t].min for t in x]),
+            numpy.array([sketches[t].max for t in x]))
+
+def follow(args):
+    """Plot the inputs while they grow, until interrupted or the window is closed"""
+    if args.keys:
+        raise ValueError("--follow does not support --keys")
+    if args.diagnostics:
+        raise ValueError("--follow does not support --diagnostics")
+    names = input_names(args)
+    fig, s_plot, t_plot, _ = make_figure(args)
+    fig.suptitle(args.title)
+    fig.set_size_inches(20 if args.hide_plot is None else 10, 8)
+    scale = 1000 if args.unit == "s" else 1
+
+    baseline_time = None
+    if args.baseline is not None:
+        baseline_df = load(args.baseline, args.unit, args.xlim, not args.no_cache)
+        baseline_time = reference_time(baseline_df, args.attitude)
+
+    states = {}
+    for name, filename, color in zip(names, args.filenames, preferred_colors * len(names)):
+        states[name] = {
+            "path": filename, "file": None, "pos": 0, "partial": "", "columns": None,
+            "sketches": {}, "band": None,
+            "s_line": s_plot.plot([], [], ".-", color=color, label=name)[0],
+            "t_line": t_plot.plot([], [], ".-", color=color, label=name)[0],
+        }
+
+    s_plot.set_xlabel("Number of threads (T)")
+    s_plot.set_ylabel("Speedup")
+    t_plot.set_xlabel("Number of threads (T)")
+    t_plot.set_ylabel("Execution time [{}]".format(args.unit))
+    interactive = args.output is None
+
+    try:
+        while not interactive or plt.fignum_exists(fig.number):
+            changed = False
+            for name, state in states.items():
+                threads, times = tail(state)
+                if not threads:
+                    continue
+                threads = numpy.array(threads)
+                times = numpy.array(times) / scale
+                for t in numpy.unique(threads):
+                    if args.xlim is None or t <= args.xlim:
+                        state["sketches"].setdefault(t, sketch.KLL()).extend(times[threads == t])
+                if not state["sketches"]:
+                    continue
+                x, count, median, mins, maxs = aggregates(state["sketches"])
+                reference = baseline_time or sketch_reference(state["sketches"], args.attitude)
+                speedup = reference / median
+                state["s_line"].set_data(x, speedup)
+                state["t_line"].set_data(x, median)
+                state["s_line"].set_label("{} {} max={:.1f}x @ T={} ({} runs)".format(
+                    name, name_sep, speedup.max(), x[speedup.argmax()], count.sum()))
+                state["t_line"].set_label("{} {} min={:.1f} {} @ T={}".format(
+                    name, name_sep, median.min(), args.unit, x[median.argmin()]))
+                # min-max band: a single polygon, moved in place at every update
+                band = numpy.concatenate((numpy.column_stack((x, maxs)),
+                                          numpy.column_stack((x, mins))[::-1]))
+                if state["band"] is None:
+                    state["band"] = t_plot.fill_between(x, mins, maxs, alpha=0.10,
+                                                        color=state["t_line"].get_color())
+                state["band"].set_verts([band])
+                changed = True
+
+            if changed:
+                for ax in (s_plot, t_plot):
+                    ax.relim()
+                    if ax is t_plot:
+                        # relim() only looks at the lines, not at the bands
+                        for state in states.values():
+                            if state["band"] is not None:
+                                ax.update_datalim(state["band"].get_paths()[0].vertices)
+                    ax.autoscale_view()
+                    ax.legend(loc="best")
+                if interactive:
+                    fig.canvas.draw_idle()
+                else:
+                    fig.savefig(args.output)
+            if interactive:
+                plt.pause(args.interval)
+            else:
+                time.sleep(args.interval)
+    except KeyboardInterrupt:
+        pass
+
+    for state in states.values():
+        if state["file"] is not None:
+            state["file"].close()
+
+# ===== COMPARE MODE ====================================================================
+
+# exit status of 'qplot compare' when a thread count regresses, distinct from the input
+# errors (1) and from the usage errors of argparse (2)
+regression_status = 3
+
+def make_compare_parser():
+    parser = argparse.ArgumentParser(prog="qplot compare",
+        description="Statistical regression detection between two campaigns. For each "
+                    "number of threads in both files, the runs are compared with a "
+                    "Mann-Whitney U test, the Hodges-Lehmann shift and a bootstrap "
+                    "confidence interval of the ratio of the medians. The exit status "
+                    "is 0 without regression, 3 when at least one thread count regresses, "
+                    "1 on an input error and 2 on a usage error.")
+
+    parser.add_argument("old", metavar="OLD", type=str,
+        help="CSV file of the reference campaign")
+
+    parser.add_argument("new", metavar="NEW", type=str,
+        help="CSV file of the campaign under test")
+
+    parser.add_argument("-u", "--unit", type=str, choices=["s", "ms"], default="ms",
+        help="Time unit of the table. Default is 'ms'")
+
+    parser.add_argument("-X", "--xlim", metavar="NUM", type=float, default=None,
+        help="Ignore runs with more threads than this")
+
+    parser.add_argument("--alpha", type=float, default=0.05,
+        help="Significance level of the test. Default is 0.05")
+
+    parser.add_argument("--threshold", type=float, default=0.05,
+        help="Minimum relative slowdown (Hodges-Lehmann shift over the old median) "
+             "to report a regression. Default is 0.05 (5%%)")
+
+    parser.add_argument("--bootstrap", metavar="B", type=int, default=2000,
+        help="Number of bootstrap resamples of the confidence interval. Default is 2000")
+
+    parser.add_argument("--confidence", metavar="LEVEL", type=float, default=0.95,
+        help="Confidence level of the interval. Default is 0.95")
+
+    parser.add_argument("--seed", metavar="NUM", type=int, default=None,
+        help="Seed of the random generator used by the bootstrap")
+
+    parser.add_argument("-j", "--jobs", metavar="NUM", type=int, default=None,
+        help="Number of threads used by the bootstrap. Default is the number of cores")
+
+    parser.add_argument("--no-cache", action="store_true",
+        help="Parse the CSV files again instead of using the binary cache")
+
+    parser.add_argument("-o", "--output", metavar="FILENAME", type=str, default=None,
+        help="Also save the table to a CSV file")
+
+    return parser
+
+def compare(old, new, alpha=0.05, threshold=0.05, B=2000, confidence=0.95, seed=None,
+            jobs=None):
+    """Compare the runs of two campaigns for every number of threads they share.
+
+    Returns a frame indexed by 'threads' with the sample sizes, the medians, the relative
+    change of the median, the Hodges-Lehmann shift (absolute and relative to the old
+    median), the bootstrap interval of the relative change, the U statistic of the new
+    runs, the p-value and a 'verdict' ('regression', 'improvement' or '')."""
+    common = numpy.intersect1d(old["threads"].unique(), new["threads"].unique())
+    old = old[old["threads"].isin(common)]
+    new = new[new["threads"].isin(common)]
+
+    mw = twosample.mann_whitney(new["threads"], new["time"], old["threads"], old["time"])
+    shift = twosample.hodges_lehmann(new["threads"], new["time"], old["threads"], old["time"],
+                                     seed=seed)
+
+    old_groups = {t: g.to_numpy() for t, g in old.groupby("threads")["time"]}
+    new_groups = {t: g.to_numpy() for t, g in new.groupby("threads")["time"]}
+    ci = bootstrap.ratio_ci(new_groups, {t: (t, old_groups[t]) for t in common}, B,
+                            confidence, seed=seed, jobs=jobs)
+
+    table = pandas.DataFrame({
+        "n_old": mw["n_b"].to_numpy(),
+        "n_new": mw["n_a"].to_numpy(),
+        "median_old": old.groupby("threads")["time"].median().to_numpy(),
+        "median_new": new.groupby("threads")["time"].median().to_numpy(),
+    }, index=pandas.Index(common, name="threads"))
+    table["change"] = table["median_new"] / table["median_old"] - 1
+    table["shift"] = shift.to_numpy()
+    table["shift_rel"] = table["shift"] / table["median_old"]
+    table["ci_low"] = [ci[t][0] - 1 for t in common]
+    table["ci_high"] = [ci[t][1] - 1 for t in common]
+    table["U"] = mw["U"].to_numpy()
+    table["p"] = mw["p"].to_numpy()
+
+    significant = table["p"] < alpha
+    table["verdict"] = ""
+    table.loc[significant & (table["shift_rel"] > threshold), "verdict"] = "regression"
+    table.loc[significant & (table["shift_rel"] < -threshold), "verdict"] = "improvement"
+    return table
+
+def print_comparison(table, unit, confidence):
+    print("{:>7} {:>5} {:>5} {:>12} {:>12} {:>8} {:>10} {:>19} {:>9}  {}".format(
+        "T", "n_old", "n_new", f"old [{unit}]", f"new [{unit}]", "change", "HL shift",
+        f"{100*confidence:.0f}% CI", "p", "verdict"))
+    for threads, row in table.iterrows():
+        print("{:>7} {:>5} {:>5} {:>12.3f} {:>12.3f} {:>+7.1f}% {:>+9.1f}% "
+              "[{:>+6.1f}%, {:>+6.1f}%] {:>9.2e}  {}".format(
+            threads, row["n_old"], row["n_new"], row["median_old"], row["median_new"],
+            100*row["change"], 100*row["shift_rel"], 100*row["ci_low"], 100*row["ci_high"],
+            row["p"], row["verdict"].upper()))
+
+def compare_main(argv):
+    args = make_compare_parser().parse_args(argv)
+    try:
+        old = load(args.old, args.unit, args.xlim, not args.no_cache)
+        new = load(args.new, args.unit, args.xlim, not args.no_cache)
+    except (OSError, ValueError) as e:
+        print("ERROR: {}".format(e))
+        return 1
+    table = compare(old, new, args.alpha, args.threshold, args.bootstrap, args.confidence,
+                    args.seed, args.jobs)
+    if len(table) == 0:
+        print("ERROR: the two campaigns have no thread count in common")
+        return 1
+
+    print_comparison(table, args.unit, args.confidence)
+    if args.output is not None:
+        table.to_csv(args.output)
+        print("Saved table to {}".format(args.output))
+
+    regressions = table.index[table["verdict"] == "regression"]
+    if len(regressions) > 0:
+        print("Regression at T = {}".format(", ".join(str(t) for t in regressions)))
+        return regression_status
+    print("No regression")
+    return 0
+
+# ===== MAIN ============================================================================
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] == "compare":
+        return compare_main(argv[1:])
+
+    parser = make_parser()
+    args = parser.parse_args(argv)
+    if args.keys:
+        unsupported = sweep_unsupported(args)
+        if unsupported:
+            hint = ", use --diagnostics-csv" if args.diagnostics else ""
+            parser.error("--keys does not support {}{}".format(", ".join(unsupported), hint))
+
+    if args.batch is not None:
+        matplotlib.use("Agg")
+        return 0 if batch(args) else 1
+
+    if not args.filenames:
+        parser.error("at least one input file is required")
+
+    if args.follow:
+        try:
+            follow(args)
+        except ValueError as e:
+            print("ERROR: {}".format(e))
+            return 1
+        return 0
+
+    try:
+        fig, _ = render(args)
+    except ValueError as e:
+        print("ERROR: {}".format(e))
+        return 1
+
+    # save to file or show
+    if args.output is not None:
+        plt.savefig(args.output)
+        print("Saved plot to {}".format(args.output))
+    else:
+        plt.show()
+    return 0
 
+if __name__ == "__main__":
+    sys.exit(main())
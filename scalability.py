@@ -0,0 +1,145 @@
+import scipy.optimize
+import scipy.sparse
+import pandas
+import numpy
+
+# Scalability models of the speedup S(T) as a function of the number of threads T.
+#
+# Amdahl N.J.    1967  Validity of the single processor approach to achieving large
+#                      scale computing capabilities. AFIPS Conference Proceedings
+# Gustafson J.L. 1988  Reevaluating Amdahl's law. Communications of the ACM 31(5)
+# Gunther N.J.   1993  A simple capacity model of massively parallel transaction
+#                      systems. CMG Conference (Universal Scalability Law)
+#
+# All the curves are fitted together for a given model: the residuals of every curve
+# are stacked in a single least-squares problem whose Jacobian is block-diagonal, one
+# block per curve, and solved with one call to scipy.optimize.least_squares.
+
+def amdahl(T, serial):
+    return T / (1 + serial * (T - 1))
+
+def gustafson(T, serial):
+    return T - serial * (T - 1)
+
+def usl(T, contention, coherency):
+    return T / (1 + contention * (T - 1) + coherency * T * (T - 1))
+
+# name: (function, parameter names, initial guess, lower bounds, upper bounds)
+models = {
+    "amdahl": (amdahl, ["serial"], [0.1], [0.0], [1.0]),
+    "gustafson": (gustafson, ["serial"], [0.1], [0.0], [1.0]),
+    "usl": (usl, ["contention", "coherency"], [0.1, 1e-4], [0.0, 0.0], [1.0, numpy.inf]),
+}
+
+# below this coherency, or beyond 'horizon' times the largest measured thread count,
+# the USL peak is an artifact of the fit and the curve is reported without a peak
+min_coherency = 1e-9
+horizon = 10
+
+def peak(model, params, max_threads=None):
+    """Thread count at which the model speedup is maximum: inf if it never decreases,
+    or if the maximum is far beyond the measured range ('max_threads')"""
+    if model == "usl":
+        contention, coherency = params
+        if coherency < min_coherency:
+            return numpy.inf
+        T = numpy.sqrt((1 - contention) / coherency)
+        if max_threads is not None and T > horizon * max_threads:
+            return numpy.inf
+        return T
+    return numpy.inf
+
+def limit(model, params, max_threads=None):
+    """Speedup at the peak thread count. Without a peak, the asymptote of the model
+    (1/serial for Amdahl's law, 1/contention for the USL) or inf"""
+    T = peak(model, params, max_threads)
+    if numpy.isfinite(T):
+        return models[model][0](T, *params)
+    if model in ("amdahl", "usl"):
+        with numpy.errstate(divide="ignore"):
+            return 1 / params[0]
+    return numpy.inf
+
+def fit(curves, model="amdahl"):
+    """Fit a model to several speedup curves at once.
+
+    'curves' maps a name to a pair of arrays (threads, speedup). Returns a frame indexed
+    by name with the fitted parameters, their standard errors ('<param>_err'), the RMSE
+    of the fit, the peak thread count and the speedup at the peak (see peak and limit).
+    Points with a non-finite speedup (e.g. a 0 ms time) are ignored, and a curve
+    without any finite point gets NaN for everything."""
+    func, params, p0, lb, ub = models[model]
+    k = len(params)
+    columns = [c for p in params for c in (p, p + "_err")] + ["rmse", "peak_T", "peak_speedup"]
+
+    x, y = {}, {}
+    for n in curves:
+        xi = numpy.asarray(curves[n][0], dtype=numpy.float64)
+        yi = numpy.asarray(curves[n][1], dtype=numpy.float64)
+        finite = numpy.isfinite(xi) & numpy.isfinite(yi)
+        if finite.any():
+            x[n], y[n] = xi[finite], yi[finite]
+    names = list(x)
+    F = len(names)
+    empty = pandas.DataFrame(numpy.nan, columns=columns, index=pandas.Index(
+        list(curves), name="name", tupleize_cols=False))
+    if F == 0:
+        return empty
+
+    x = [x[n] for n in names]
+    y = [y[n] for n in names]
+    sizes = numpy.array([len(xi) for xi in x])
+    owner = numpy.repeat(numpy.arange(F), sizes)
+    x = numpy.concatenate(x)
+    y = numpy.concatenate(y)
+
+    def residuals(p):
+        p = p.reshape(F, k)[owner]
+        return func(x, *p.T) - y
+
+    # row i only depends on the parameters of the curve it belongs to
+    rows = numpy.repeat(numpy.arange(len(x)), k)
+    cols = (owner[:, None] * k + numpy.arange(k)).ravel()
+    sparsity = scipy.sparse.csr_matrix((numpy.ones(len(rows)), (rows, cols)),
+                                       shape=(len(x), F * k))
+
+    res = scipy.optimize.least_squares(
+        residuals, numpy.tile(p0, F), jac_sparsity=sparsity, method="trf",
+        bounds=(numpy.tile(lb, F), numpy.tile(ub, F)))
+
+    P = res.x.reshape(F, k)
+    J = scipy.sparse.csr_matrix(res.jac)
+    offsets = numpy.append(0, numpy.cumsum(sizes))
+
+    out = []
+    for f, name in enumerate(names):
+        r = res.fun[offsets[f]:offsets[f+1]]
+        Jf = J[offsets[f]:offsets[f+1], f*k:(f+1)*k].toarray()
+        dof = max(len(r) - k, 1)
+        cov = numpy.linalg.pinv(Jf.T @ Jf) * (r @ r) / dof
+        row = {"name": name}
+        for i, p in enumerate(params):
+            row[p] = P[f, i]
+            row[p + "_err"] = numpy.sqrt(cov[i, i])
+        row["rmse"] = numpy.sqrt(numpy.mean(r**2))
+        max_threads = x[offsets[f]:offsets[f+1]].max()
+        row["peak_T"] = peak(model, P[f], max_threads)
+        row["peak_speedup"] = limit(model, P[f], max_threads)
+        out.append(row)
+    fits = pandas.DataFrame(out).set_index("name")[columns]
+    return fits.reindex(empty.index) if len(fits) < len(empty) else fits
+
+def fit_all(curves, names=("amdahl", "gustafson", "usl")):
+    """Fit several models. Returns a frame indexed by (name, model)"""
+    fits = [fit(curves, m).assign(model=m) for m in names]
+    return pandas.concat(fits).set_index("model", append=True)
+
+def predict(fits, T):
+    """Speedup predicted by every fit of fit_all() at the thread counts 'T'.
+    Returns a frame indexed like 'fits' with one column per thread count"""
+    T = numpy.atleast_1d(T)
+    out = []
+    for (name, model), row in fits.iterrows():
+        func, params = models[model][:2]
+        out.append(func(T.astype(numpy.float64), *[row[p] for p in params]))
+    return pandas.DataFrame(out, index=fits.index, columns=T)
@@ -0,0 +1,136 @@
+import numpy
+
+# KLL quantile sketch.
+#
+# Karnin Z., Lang K., Liberty E.
+# 2016
+# Optimal Quantile Approximation in Streams.
+# IEEE 57th Annual Symposium on Foundations of Computer Science (FOCS)
+# https://arxiv.org/abs/1603.05346
+#
+# Items are kept in a hierarchy of compactors: an item at level h stands for 2^h
+# samples. When a level is full it is sorted and every other item (random offset) is
+# promoted to the next level. Level capacities shrink geometrically going down the
+# hierarchy, so the memory is O(k) regardless of the number of samples.
+#
+# Error bounds. A quantile q returned by the sketch is the exact quantile of some rank
+# q' with |q - q'| <= rank_error(k), with 99% probability (about 1.3% for the default
+# k=200, the bound measured for the reference implementation by Apache DataSketches).
+# The MAD estimate of mad() is the median of |x - m| over the retained items, where m
+# is the estimated median: its rank error in the distribution of the deviations is at
+# most about twice rank_error(k), plus the error induced by m itself.
+# Count, min, max, mean and standard deviation are exact.
+
+class KLL:
+    def __init__(self, k=200, seed=None):
+        self.k = k
+        self.rng = numpy.random.default_rng(seed)
+        self.levels = [numpy.empty(0)]
+        self.pending = []
+        self.n = 0
+        self.min = numpy.inf
+        self.max = -numpy.inf
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def capacity(self, h):
+        depth = len(self.levels) - h - 1
+        return max(int(numpy.ceil(self.k * (2 / 3) ** depth)), 2)
+
+    def update(self, x):
+        self.extend([x])
+
+    def extend(self, values):
+        values = numpy.asarray(values, dtype=numpy.float64).ravel()
+        if len(values) == 0:
+            return
+        self.moments(len(values), values.mean(), ((values - values.mean())**2).sum())
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+        self.pending.append(values)
+        if sum(len(p) for p in self.pending) >= self.capacity(0):
+            self.flush()
+
+    def moments(self, n, mean, m2):
+        """Merge count, mean and sum of squared deviations of another set of samples"""
+        total = self.n + n
+        delta = mean - self.mean
+        self.mean += delta * n / total
+        self.m2 += m2 + delta**2 * self.n * n / total
+        self.n = total
+
+    def std(self, ddof=1):
+        return numpy.sqrt(self.m2 / (self.n - ddof)) if self.n > ddof else numpy.nan
+
+    def flush(self):
+        if self.pending:
+            self.levels[0] = numpy.concatenate([self.levels[0]] + self.pending)
+            self.pending = []
+        self.compress()
+
+    def compress(self):
+        h = 0
+        while h < len(self.levels):
+            level = self.levels[h]
+            if len(level) >= self.capacity(h):
+                if h + 1 == len(self.levels):
+                    self.levels.append(numpy.empty(0))
+                level = numpy.sort(level)
+                # an odd item stays at this level
+                keep = level[:len(level) % 2]
+                level = level[len(level) % 2:]
+                promoted = level[self.rng.integers(2)::2]
+                self.levels[h] = keep
+                self.levels[h+1] = numpy.concatenate((self.levels[h+1], promoted))
+            h += 1
+
+    def merge(self, other):
+        """Merge another sketch into this one"""
+        self.flush()
+        other.flush()
+        while len(self.levels) < len(other.levels):
+            self.levels.append(numpy.empty(0))
+        for h, level in enumerate(other.levels):
+            self.levels[h] = numpy.concatenate((self.levels[h], level))
+        if other.n > 0:
+            self.moments(other.n, other.mean, other.m2)
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.compress()
+        return self
+
+    def weighted(self):
+        """Retained items in ascending order and their weights"""
+        self.flush()
+        items = numpy.concatenate(self.levels)
+        weights = numpy.concatenate([numpy.full(len(l), 2.0**h) for h, l in enumerate(self.levels)])
+        order = numpy.argsort(items, kind="stable")
+        return items[order], weights[order]
+
+    def quantile(self, q):
+        """Approximate quantile(s) of the samples seen so far"""
+        if self.n == 0:
+            return numpy.full(numpy.shape(q), numpy.nan) if numpy.ndim(q) else numpy.nan
+        items, weights = self.weighted()
+        cdf = numpy.cumsum(weights)
+        rank = numpy.asarray(q) * cdf[-1]
+        i = numpy.minimum(numpy.searchsorted(cdf, rank, side="left"), len(items) - 1)
+        out = numpy.clip(items[i], self.min, self.max)
+        return out if numpy.ndim(q) else float(out)
+
+    def median(self):
+        return self.quantile(0.5)
+
+def rank_error(k=200):
+    """Normalized rank error of a single quantile query, with 99% confidence"""
+    return 2.296 / k**0.9723
+
+def mad(s):
+    """Approximate median absolute deviation of the samples summarized by a sketch"""
+    if s.n == 0:
+        return numpy.nan
+    items, weights = s.weighted()
+    dev = numpy.abs(items - s.median())
+    order = numpy.argsort(dev)
+    cdf = numpy.cumsum(weights[order])
+    return float(dev[order][numpy.searchsorted(cdf, 0.5 * cdf[-1])])
@@ -2,17 +2,30 @@ from scipy.stats import norm
 import seaborn as sns
 import pandas as pd
 import numpy as np
+import sketch
 import re
 
 available = {
     "sd", "piX", "rsdX", "mad", "range", "iqr"
 }
 
+# accepted spellings of the parametric measures (qplot's help uses pX, stdX, rstdX)
+aliases = {"p": "pi", "pi": "pi", "sd": "sd", "std": "sd", "rsd": "rsd", "rstd": "rsd"}
+
 def mad(y):
     if not isinstance(y, np.ndarray):
         y = np.array(y)
     return np.median(np.abs(y - np.median(y)))
 
+def parse(spread_measure):
+    """Split a spread measure into its kind and parameter, e.g. 'p90' -> ('pi', 90.0)"""
+    if spread_measure in ("mad", "range", "iqr"):
+        return spread_measure, None
+    m = re.fullmatch(r"([a-z]+)(\d+(\.\d+)?)", spread_measure)
+    if m is None or m.group(1) not in aliases:
+        raise ValueError(f"Unknown spread measure '{spread_measure}'")
+    return aliases[m.group(1)], float(m.group(2))
+
 def lower(spread_measure):
     n = re.search(r"\d+(\.\d+)?", spread_measure)
     if spread_measure.startswith("sd"):
@@ -49,19 +62,236 @@ def upper(spread_measure):
     elif spread_measure == "iqr":
         return lambda y: np.quantile(y, 0.75)
 
-def draw(ax, spread_measures, df, x, y, z=None, colors=None, palette=None, style="area"):
+# ===== VECTORIZED ENGINE ===============================================================
+#
+# Every group is sorted once into one contiguous buffer: group g occupies
+# v[start[g] : start[g] + n[g]] in ascending order. All the measures are then computed
+# for all the groups at once with index arithmetic on that buffer.
+
+def is_sorted(codes, values):
+    """Whether the rows are already sorted by group and then by value, as the inputs
+    loaded from the cache of csvcache (sorted by threads and time)"""
+    ties = np.ones(max(len(values) - 1, 0), dtype=bool)
+    for c in codes:
+        d = np.diff(c)
+        if (d[ties] < 0).any():
+            return False
+        ties &= d == 0
+    return not (np.diff(values)[ties] < 0).any()
+
+def group_sort(codes, values):
+    """Sort 'values' by group (given as a list of integer code arrays) and then by value.
+    Returns the sorted buffer, the start offset and the size of each group, and the
+    permutation that sorts 'values'. Sorted inputs are detected in O(n) and not sorted
+    again."""
+    if is_sorted(codes, values):
+        order = np.arange(len(values))
+        v = values
+    else:
+        order = np.lexsort((values,) + tuple(reversed(codes)))
+        v = values[order]
+        codes = [c[order] for c in codes]
+    change = np.zeros(len(v), dtype=bool)
+    change[:1] = True
+    for c in codes:
+        change[1:] |= c[1:] != c[:-1]
+    start = np.flatnonzero(change)
+    n = np.diff(np.append(start, len(v)))
+    return v, start, n, order
+
+def quantile(v, start, n, q):
+    """Per-group quantile on a group-sorted buffer ('linear' method, as numpy.quantile)"""
+    pos = start + q * (n - 1)
+    lo = np.floor(pos).astype(np.int64)
+    hi = np.minimum(lo + 1, start + n - 1)
+    return v[lo] + (pos - lo) * (v[hi] - v[lo])
+
+def group_mad(v, start, n, median=None):
+    """Per-group median absolute deviation on a group-sorted buffer"""
+    if median is None:
+        median = quantile(v, start, n, 0.5)
+    gid = np.repeat(np.arange(len(start)), n)
+    dev = np.abs(v - median[gid])
+    dev = dev[np.lexsort((dev, gid))]
+    return quantile(dev, start, n, 0.5)
+
+def bands(kind, p, quantile, median, mean, std, mad_, min_, max_):
+    """Lower and upper bounds of a parsed spread measure, given the group statistics
+    ('quantile' is a function of the probability, the others are arrays)"""
+    if kind == "sd":
+        return mean - p * std(), mean + p * std()
+    elif kind == "pi":
+        return quantile((1 - p / 100.0) / 2), quantile((1 + p / 100.0) / 2)
+    elif kind == "rsd":
+        d = p * (1 / norm.ppf(0.75)) * mad_()
+        return mean - d, mean + d
+    elif kind == "mad":
+        return median - mad_(), median + mad_()
+    elif kind == "range":
+        return min_, max_
+    elif kind == "iqr":
+        return quantile(0.25), quantile(0.75)
+
+def tidy(group_keys, spread_measures, bounds, median, n):
+    frames = []
+    for sm, (lo, hi) in zip(spread_measures, bounds):
+        frame = pd.DataFrame(group_keys)
+        frame["measure"] = sm
+        frame["lower"] = lo
+        frame["upper"] = hi
+        frame["median"] = median
+        frame["n"] = n
+        frames.append(frame)
+    return pd.concat(frames, ignore_index=True)
+
+def group_columns(x, z=None):
     if z is None:
+        return [x]
+    if isinstance(z, str):
+        return [z, x]
+    return list(z) + [x]
+
+def compute(df, x, y, spread_measures, z=None, sketch_threshold=None):
+    """Compute every spread measure for every (z, x) group in a single pass ('z' can
+    also be a list of columns).
+
+    Inputs with more than 'sketch_threshold' rows are summarized with quantile sketches
+    instead (see sketch_compute). Returns a tidy frame with one row per group and
+    measure, holding the columns [z,] x, 'measure', 'lower', 'upper', 'median' and 'n'."""
+    if sketch_threshold and len(df) > sketch_threshold:
+        return sketch_compute(df, x, y, spread_measures, z)
+
+    keys = group_columns(x, z)
+    df = df[keys + [y]].dropna()
+    columns = keys + ["measure", "lower", "upper", "median", "n"]
+    if len(df) == 0:
+        return pd.DataFrame(columns=columns)
+
+    factors = [pd.factorize(df[k], sort=True) for k in keys]
+    codes = [c for c, _ in factors]
+    v, start, n, order = group_sort(codes, df[y].to_numpy(dtype=np.float64))
+
+    # keys of each group, in the same order as 'start'
+    first = order[start]
+    group_keys = {k: u[c[first]] for k, (c, u) in zip(keys, factors)}
+
+    parsed = [parse(sm) for sm in spread_measures]
+    kinds = {kind for kind, _ in parsed}
+
+    median = quantile(v, start, n, 0.5)
+    mean = None
+    if kinds & {"sd", "rsd"}:
+        mean = np.add.reduceat(v, start) / n
+
+    def std():
+        with np.errstate(divide="ignore", invalid="ignore"):
+            sq = np.add.reduceat((v - np.repeat(mean, n)) ** 2, start)
+            return np.sqrt(sq / (n - 1))
+
+    mad_ = cached(lambda: group_mad(v, start, n, median))
+    bounds = [bands(kind, p, lambda q: quantile(v, start, n, q), median, mean, std, mad_,
+                    v[start], v[start + n - 1])
+              for kind, p in parsed]
+    return tidy(group_keys, spread_measures, bounds, median, n)[columns]
+
+def cached(f):
+    value = []
+    def get():
+        if not value:
+            value.append(f())
+        return value[0]
+    return get
+
+# ===== SKETCHES ========================================================================
+#
+# For very large groups the exact engine sorts every sample and keeps several full-size
+# temporaries (sorted buffer, deviations for the MAD...). sketch_compute() instead feeds
+# the rows of a frame in chunks into one KLL sketch per group (see sketch.py), in
+# near-linear time and O(k log n) memory per group on top of the frame. For inputs too
+# large to load, stream_sketches() reads a structured array sorted by the group column
+# (e.g. the memory-mapped cache entry of csvcache) one chunk at a time, so that only
+# the sketches and a single chunk are ever in memory. Count, min, max, mean and standard
+# deviations stay exact; quantiles (piX, iqr, median) have a rank error of at most
+# sketch.rank_error(k) (about 0.14% for the default k=2000) and the MAD (mad, rsdX)
+# about twice that.
+
+def sketches(df, keys, y, k=2000, chunk=2**20):
+    """{group key tuple: KLL sketch of 'y'}, reading 'df' in chunks of rows"""
+    out = {}
+    for begin in range(0, len(df), chunk):
+        part = df.iloc[begin:begin+chunk]
+        values = part[y].to_numpy(dtype=np.float64)
+        for key, idx in part.groupby(keys).indices.items():
+            key = key if isinstance(key, tuple) else (key,)
+            group = values[idx]
+            out.setdefault(key, sketch.KLL(k)).extend(group[~np.isnan(group)])
+    return out
+
+def stream_sketches(data, x, y, transform=None, k=2000, chunk=2**16):
+    """{(x value,): KLL sketch of 'y'} of a structured array sorted by 'x', reading
+    'chunk' rows at a time. 'transform' maps every chunk of 'y' values (e.g. a change
+    of unit) before it is added to the sketches"""
+    out = {}
+    for begin in range(0, len(data), chunk):
+        part = data[begin:begin+chunk]
+        keys = np.asarray(part[x])
+        values = np.asarray(part[y], dtype=np.float64)
+        if transform is not None:
+            values = transform(values)
+        bounds = np.flatnonzero(np.diff(keys)) + 1
+        for key, group in zip(keys[np.append(0, bounds)].tolist(), np.split(values, bounds)):
+            out.setdefault((key,), sketch.KLL(k)).extend(group[~np.isnan(group)])
+    return out
+
+def sketch_stats(groups, keys, spread_measures):
+    """Tidy frame of compute() from {group key tuple: KLL sketch} ('keys' names the
+    elements of the tuples)"""
+    columns = keys + ["measure", "lower", "upper", "median", "n"]
+    groups = {key: s for key, s in sorted(groups.items()) if s.n > 0}
+    if not groups:
+        return pd.DataFrame(columns=columns)
+
+    group_keys = {col: [key[i] for key in groups] for i, col in enumerate(keys)}
+    ss = list(groups.values())
+
+    def stat(f):
+        return np.array([f(s) for s in ss])
+
+    median = stat(sketch.KLL.median)
+    mean = stat(lambda s: s.mean)
+    bounds = [bands(kind, p, lambda q: stat(lambda s: s.quantile(q)), median, mean,
+                    lambda: stat(sketch.KLL.std), cached(lambda: stat(sketch.mad)),
+                    stat(lambda s: s.min), stat(lambda s: s.max))
+              for kind, p in map(parse, spread_measures)]
+    return tidy(group_keys, spread_measures, bounds, median, stat(lambda s: s.n))[columns]
+
+def sketch_compute(df, x, y, spread_measures, z=None, k=2000):
+    """Same as compute(), with sketch-based estimators"""
+    keys = group_columns(x, z)
+    return sketch_stats(sketches(df, keys, y, k), keys, spread_measures)
+
+def draw(ax, spread_measures, df, x, y, z=None, colors=None, palette=None, style="area",
+         stats=None, sketch_threshold=None):
+    """Draw the spread bands of 'y' over 'x' (one per 'z' value). A frame previously
+    returned by compute() can be passed as 'stats' to skip the computation, and then
+    'df' can be None. Returns the tidy frame used for drawing."""
+    if z is None:
+        columns = (stats if df is None else df).columns
         z = "z" * (max([len(c) for c in columns]) + 1) # unique column name
-        df[z] = 0
+        if df is not None:
+            df = df.assign(**{z: 0})
+        if stats is not None:
+            stats = stats.assign(**{z: 0})
 
     alphas = {
         "area": np.linspace(0.15, 0.05, len(spread_measures)),
         "bar": np.linspace(0.30, 0.10, len(spread_measures))
     }[style]
 
-    x_dom = df[x].unique()
-    z_dom = df[z].unique()
-    groups = df.groupby([z, x])[y]
+    if stats is None:
+        stats = compute(df, x, y, spread_measures, z=z, sketch_threshold=sketch_threshold)
+
+    z_dom = stats[z].unique()
 
     if isinstance(palette, str):
         colors = sns.color_palette(palette)
@@ -70,19 +300,20 @@ def draw(ax, spread_measures, df, x, y, z=None, colors=None, palette=None, style
     if colors is None and palette is None:
         raise Exception("Missing color and palette")
 
+    by_measure = dict(tuple(stats.groupby("measure", sort=False)))
     for i, sm in enumerate(spread_measures):
-        ys_lower = groups.apply(lower(sm))
-        ys_upper = groups.apply(upper(sm))
+        measure = by_measure[sm]
         for j, z_val in enumerate(z_dom):
             if colors is not None:
                 color = colors[j % len(colors)]
             else:
                 color = palette[z_val]
-            y_lower = ys_lower.xs(z_val)
-            y_upper = ys_upper.xs(z_val)
+            band = measure[measure[z] == z_val]
             if style == "area":
-                ax.fill_between(x_dom, y_lower, y_upper,
+                ax.fill_between(band[x], band["lower"], band["upper"],
                                 interpolate=True, color=color, alpha=alphas[i])
             elif style == "bar":
-                ax.vlines(x=x, ymin=y_lower, ymax=y_upper,
+                ax.vlines(x=band[x], ymin=band["lower"], ymax=band["upper"],
                           color=color, alpha=alphas[i], linewidth=4)
+
+    return stats
@@ -0,0 +1,5 @@
+import pathlib
+import sys
+
+# the modules of the repository are flat scripts, not a package
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
@@ -0,0 +1,17 @@
+import bootstrap
+import numpy
+
+def test_self_speedup_at_the_baseline():
+    rng = numpy.random.default_rng(0)
+    base = rng.normal(10, 1, 30)
+    groups = {1: ("a", None), 2: ("a", rng.normal(5, 0.5, 30))}
+    ci = bootstrap.ratio_ci({"a": base}, groups, B=2000, seed=1)
+    assert ci[1] == (1.0, 1.0)
+    assert ci[2][0] < 2 < ci[2][1]
+
+def test_reproducible():
+    rng = numpy.random.default_rng(0)
+    groups = {t: (None, rng.normal(10 / t, 1 / t, 20)) for t in (1, 2)}
+    numerators = {None: rng.normal(10, 1, 20)}
+    assert (bootstrap.ratio_ci(numerators, groups, B=500, seed=3) ==
+            bootstrap.ratio_ci(numerators, groups, B=500, seed=3, jobs=1))
@@ -0,0 +1,31 @@
+import csvcache
+import pytest
+import numpy
+import os
+
+@pytest.fixture(autouse=True)
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(csvcache, "cache_dir", tmp_path / "cache")
+
+def test_sorted_and_cached(tmp_path):
+    a = tmp_path / "a.csv"
+    a.write_text("threads,time,size\n2,5,big\n1,12,small\n2,4,small\n1,,big\n1,10,big\n")
+    data = csvcache.load_array(str(a))
+    assert data["threads"].tolist() == [1, 1, 2, 2]
+    assert data["time"].tolist() == [10, 12, 4, 5]
+    assert data["size"].tolist() == ["big", "small", "small", "big"]
+    assert len(list(csvcache.cache_dir.glob("*.npy"))) == 1
+    assert isinstance(csvcache.load_array(str(a)), numpy.memmap)
+
+    df = csvcache.load(str(a), columns=["size"])
+    assert df.columns.tolist() == ["size", "threads", "time"]
+    with pytest.raises(ValueError):
+        csvcache.load(str(a), columns=["affinity"])
+
+def test_modified_file_is_parsed_again(tmp_path):
+    a = tmp_path / "a.csv"
+    a.write_text("threads,time\n1,10\n")
+    assert csvcache.load_array(str(a))["time"].tolist() == [10]
+    a.write_text("threads,time\n1,10\n1,20\n")
+    os.utime(a, ns=(0, 10**9))
+    assert csvcache.load_array(str(a))["time"].tolist() == [10, 20]
@@ -0,0 +1,21 @@
+import drift
+import numpy
+
+def test_single_step():
+    rng = numpy.random.default_rng(0)
+    x = numpy.concatenate((rng.normal(10, 0.1, 300), rng.normal(11, 0.1, 200)))
+    points = drift.change_points(x)
+    assert len(points) == 1 and abs(points[0] - 300) <= 2
+    segs = drift.segments(x, points)
+    assert segs["runs"].sum() == len(x)
+    assert drift.steady_state(segs) == 1
+
+def test_stationary_series():
+    x = numpy.random.default_rng(1).normal(10, 0.1, 500)
+    assert drift.change_points(x) == []
+
+def test_autocorrelation():
+    x = numpy.random.default_rng(2).normal(0, 1, 300).cumsum()
+    d = x - x.mean()
+    ref = numpy.correlate(d, d, "full")[len(x) - 1:][:11]
+    assert numpy.allclose(drift.autocorrelation(x, 10), ref / ref[0])
@@ -0,0 +1,19 @@
+import scipy.integrate
+import scipy.stats
+import kde
+import numpy
+
+def test_matches_gaussian_kde():
+    rng = numpy.random.default_rng(0)
+    samples = [rng.normal(0, 1, 500), numpy.concatenate((rng.normal(-2, 0.5, 300),
+                                                         rng.normal(3, 1, 200)))]
+    grid = numpy.linspace(-6, 7, 200)
+    _, densities = kde.density(samples, grid, bw="scott")
+    for x, d in zip(samples, densities):
+        ref = scipy.stats.gaussian_kde(x)(grid)
+        assert numpy.abs(d - ref).max() < 1e-3 * ref.max()
+
+def test_default_grid_integrates_to_one():
+    x = numpy.random.default_rng(1).exponential(1, 1000)
+    grid, d = kde.density(x, bw="silverman")
+    assert numpy.isclose(scipy.integrate.trapezoid(d, grid), 1, atol=1e-3)
@@ -0,0 +1,40 @@
+import csvcache
+import perfprof
+import pytest
+import numpy
+
+rusage_header = "threads,time,utime,stime,maxrss,minflt,majflt,nvcsw,nivcsw"
+
+@pytest.fixture(autouse=True)
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(csvcache, "cache_dir", tmp_path / "cache")
+
+def write_rusage_csv(path, times):
+    """makebm CSV with rusage=y: every run has different rusage values"""
+    lines = [rusage_header]
+    for run, (threads, time) in enumerate(times):
+        lines.append(f"{threads},{time},{time - 1},0.5,{4000 + run},{100 + run},0,{run},{run}")
+    path.write_text("\n".join(lines) + "\n")
+
+def test_rusage_columns_are_not_problems(tmp_path):
+    a = tmp_path / "a.csv"
+    write_rusage_csv(a, [(1, 10), (1, 12), (1, 11), (2, 6), (2, 5), (2, 7)])
+    df = perfprof.load_makebm([str(a)])
+    assert df.index.names == ["cmd", "threads"]
+    assert df.index.tolist() == [("", 1), ("", 2)]
+    assert df["a"].tolist() == [11, 6]
+
+def test_mixed_rusage_and_plain_csv(tmp_path):
+    a = tmp_path / "a.csv"
+    b = tmp_path / "b.csv"
+    write_rusage_csv(a, [(1, 10), (1, 12), (1, 11), (2, 6), (2, 5), (2, 7)])
+    b.write_text("threads,time\n1,20\n1,22\n2,9\n2,8\n")
+    df = perfprof.load_makebm([str(a), str(b)], attitude="pessimistic")
+    assert df.to_numpy().tolist() == [[10, 20], [5, 8]]
+
+def test_keys(tmp_path):
+    a = tmp_path / "a.csv"
+    a.write_text("threads,time,size,utime\n1,10,64,9\n1,30,128,29\n1,12,64,11\n1,34,128,33\n")
+    df = perfprof.load_makebm([str(a)], keys=["size"])
+    assert df.index.tolist() == [("", 1, 64), ("", 1, 128)]
+    assert numpy.allclose(df["a"], [11, 32])
@@ -0,0 +1,23 @@
+import scalability
+import numpy
+
+T = numpy.array([1, 2, 4, 8, 16, 32, 64])
+
+def test_recovers_known_parameters():
+    curves = {"a": (T, scalability.amdahl(T, 0.05)), "b": (T, scalability.amdahl(T, 0.2))}
+    fits = scalability.fit(curves, "amdahl")
+    assert numpy.allclose(fits["serial"], [0.05, 0.2], atol=1e-6)
+    assert numpy.allclose(fits["peak_speedup"], [20, 5], rtol=1e-4)
+
+    fits = scalability.fit({"c": (T, scalability.usl(T, 0.02, 1e-3))}, "usl")
+    assert numpy.allclose(fits[["contention", "coherency"]].iloc[0], [0.02, 1e-3], rtol=1e-4)
+    assert numpy.isclose(fits["peak_T"].iloc[0], numpy.sqrt(0.98 / 1e-3), rtol=1e-3)
+
+def test_non_finite_points_are_ignored():
+    speedup = scalability.amdahl(T, 0.1)
+    speedup[0] = numpy.inf
+    curves = {"a": (T, speedup), "b": (T[:2], [numpy.nan, numpy.inf])}
+    fits = scalability.fit(curves, "amdahl")
+    assert fits.index.tolist() == ["a", "b"]
+    assert numpy.isclose(fits.loc["a", "serial"], 0.1, atol=1e-6)
+    assert fits.loc["b"].isna().all()
@@ -0,0 +1,35 @@
+import sketch
+import numpy
+
+def test_rank_error():
+    rng = numpy.random.default_rng(0)
+    x = rng.lognormal(0, 1, 200000)
+    s = sketch.KLL(200, seed=1)
+    for chunk in numpy.array_split(x, 97):
+        s.extend(chunk)
+    x.sort()
+    q = numpy.linspace(0.01, 0.99, 99)
+    rank = numpy.searchsorted(x, s.quantile(q)) / len(x)
+    assert numpy.abs(rank - q).max() <= sketch.rank_error(200)
+    assert sum(len(l) for l in s.levels) < 2000
+
+    assert s.n == len(x) and s.min == x[0] and s.max == x[-1]
+    assert numpy.isclose(s.mean, x.mean()) and numpy.isclose(s.std(), x.std(ddof=1))
+
+def test_merge():
+    rng = numpy.random.default_rng(2)
+    x = rng.normal(0, 1, 50000)
+    a, b = sketch.KLL(seed=3), sketch.KLL(seed=4)
+    a.extend(x[:20000])
+    b.extend(x[20000:])
+    a.merge(b)
+    assert a.n == len(x) and numpy.isclose(a.std(), x.std(ddof=1))
+    x.sort()
+    rank = numpy.searchsorted(x, a.median()) / len(x)
+    assert abs(rank - 0.5) <= sketch.rank_error(200)
+
+def test_small_samples_are_exact():
+    s = sketch.KLL()
+    s.extend([5, 1, 4, 2, 3])
+    assert s.median() == 3
+    assert sketch.mad(s) == 1
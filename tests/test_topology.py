@@ -0,0 +1,30 @@
+import topology
+import pytest
+
+def write_cpu(root, cpu, package, core, siblings, node):
+    topo = root / f"cpu{cpu}" / "topology"
+    topo.mkdir(parents=True)
+    (topo / "physical_package_id").write_text(f"{package}\n")
+    (topo / "core_id").write_text(f"{core}\n")
+    (topo / "thread_siblings_list").write_text(f"{siblings}\n")
+    (root / f"cpu{cpu}" / f"node{node}").mkdir()
+
+def test_parse_cpulist():
+    assert topology.parse_cpulist("0-3,8,10-11\n") == [0, 1, 2, 3, 8, 10, 11]
+    assert topology.parse_cpulist("") == []
+
+def test_read(tmp_path):
+    # 2 cores with 2 SMT siblings each, one per node
+    for cpu in range(4):
+        core = cpu % 2
+        write_cpu(tmp_path, cpu, 0, core, f"{core},{core + 2}", core)
+    (tmp_path / "cpu4").mkdir()  # offline
+    df = topology.read(tmp_path)
+    assert df.index.tolist() == [0, 1, 2, 3]
+    assert df["node"].tolist() == [0, 1, 0, 1]
+    assert df["smt"].tolist() == [0, 0, 1, 1]
+    assert df["siblings"].tolist() == ["0,2", "1,3", "0,2", "1,3"]
+
+def test_no_topology(tmp_path):
+    with pytest.raises(ValueError):
+        topology.read(tmp_path)
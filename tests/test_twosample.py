@@ -0,0 +1,31 @@
+import scipy.stats
+import twosample
+import numpy
+
+def test_shifted_sample():
+    rng = numpy.random.default_rng(0)
+    b = rng.normal(10, 1, 40)
+    a = numpy.concatenate((b + 2, b[:30] - 0.5))
+    groups_a = numpy.repeat([1, 2], [40, 30])
+    groups_b = numpy.concatenate((numpy.ones(40), numpy.full(30, 2)))
+    b = numpy.concatenate((b, b[:30]))
+
+    mw = twosample.mann_whitney(groups_a, a, groups_b, b)
+    assert mw.index.tolist() == [1, 2]
+    assert mw[["n_a", "n_b"]].to_numpy().tolist() == [[40, 40], [30, 30]]
+    for g in (1, 2):
+        ref = scipy.stats.mannwhitneyu(a[groups_a == g], b[groups_b == g], method="asymptotic")
+        assert numpy.isclose(mw.loc[g, "U"], ref.statistic)
+        assert numpy.isclose(mw.loc[g, "p"], ref.pvalue)
+    assert mw.loc[1, "p"] < 1e-6
+
+    shift = twosample.hodges_lehmann(groups_a, a, groups_b, b)
+    assert numpy.allclose(shift.loc[[1, 2]], [2, -0.5])
+
+def test_ties():
+    a = numpy.array([1, 1, 2, 2, 3])
+    b = numpy.array([1, 2, 2, 3, 3, 3])
+    mw = twosample.mann_whitney(numpy.zeros(5), a, numpy.zeros(6), b)
+    ref = scipy.stats.mannwhitneyu(a, b, method="asymptotic")
+    assert numpy.isclose(mw["U"].iloc[0], ref.statistic)
+    assert numpy.isclose(mw["p"].iloc[0], ref.pvalue)
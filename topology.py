@@ -0,0 +1,54 @@
+import pathlib
+import pandas
+
+# CPU topology of a Linux machine, read from sysfs.
+#
+# Every logical CPU in /sys/devices/system/cpu/cpuN has a 'topology' directory with
+# its package (socket), its core and the list of its SMT siblings, and a 'nodeX' link
+# to its NUMA node. The root can point to a copy of that directory, e.g. to analyze
+# measurements on another machine than the one they were taken on:
+#
+#   tar czf topo.tgz /sys/devices/system/cpu/cpu[0-9]*/topology /sys/devices/system/cpu/cpu[0-9]*/node*
+
+root = "/sys/devices/system/cpu"
+
+def parse_cpulist(text):
+    """CPUs of a list in the kernel format, e.g. '0-3,8,10-11'"""
+    cpus = []
+    for part in text.strip().split(","):
+        if not part:
+            continue
+        if "-" in part:
+            first, last = part.split("-")
+            cpus.extend(range(int(first), int(last) + 1))
+        else:
+            cpus.append(int(part))
+    return cpus
+
+def read(path=root):
+    """Frame indexed by logical CPU with the columns 'package', 'node', 'core' (the
+    core id, unique within a package), 'smt' (rank of the CPU among the siblings of
+    its core) and 'siblings' (the siblings of its core, as a CPU list)"""
+    rows = []
+    for cpu_dir in pathlib.Path(path).glob("cpu[0-9]*"):
+        topo = cpu_dir / "topology"
+        if not topo.is_dir():
+            # offline CPU
+            continue
+        cpu = int(cpu_dir.name[3:])
+        siblings_file = topo / "thread_siblings_list"
+        if not siblings_file.exists():
+            siblings_file = topo / "core_cpus_list"
+        siblings = parse_cpulist(siblings_file.read_text())
+        nodes = sorted(int(p.name[4:]) for p in cpu_dir.glob("node[0-9]*"))
+        rows.append({
+            "cpu": cpu,
+            "package": int((topo / "physical_package_id").read_text()),
+            "node": nodes[0] if nodes else 0,
+            "core": int((topo / "core_id").read_text()),
+            "smt": siblings.index(cpu) if cpu in siblings else 0,
+            "siblings": ",".join(str(c) for c in siblings),
+        })
+    if not rows:
+        raise ValueError(f"no CPU topology found in '{path}'")
+    return pandas.DataFrame(rows).set_index("cpu").sort_index()
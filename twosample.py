@@ -0,0 +1,81 @@
+from scipy.stats import norm
+import pandas
+import numpy
+
+# Two-sample statistics computed for many groups at once (e.g. one group per number of
+# threads). Both samples of every group are concatenated, sorted once by (group, value)
+# and the statistics are derived with index arithmetic, without a loop over groups.
+
+def mann_whitney(groups_a, a, groups_b, b):
+    """Mann-Whitney U test of sample 'a' against sample 'b' for every group.
+
+    'groups_a' and 'groups_b' hold the group of each value. The p-value is two-sided
+    and uses the normal approximation with tie and continuity corrections (as
+    scipy.stats.mannwhitneyu with method='asymptotic'). Returns a frame indexed by group
+    with the columns 'n_a', 'n_b', 'U' (statistic of 'a') and 'p'."""
+    values = numpy.concatenate((a, b)).astype(numpy.float64)
+    is_a = numpy.concatenate((numpy.ones(len(a)), numpy.zeros(len(b))))
+    codes, uniques = pandas.factorize(numpy.concatenate((groups_a, groups_b)), sort=True)
+    G = len(uniques)
+
+    order = numpy.lexsort((values, codes))
+    v, c, f = values[order], codes[order], is_a[order]
+    n = numpy.bincount(c, minlength=G)
+    n_a = numpy.bincount(c, weights=f, minlength=G)
+    n_b = n - n_a
+    start = numpy.append(0, numpy.cumsum(n)[:-1])
+
+    # runs of equal values within a group get their average rank
+    change = numpy.ones(len(v), dtype=bool)
+    change[1:] = (c[1:] != c[:-1]) | (v[1:] != v[:-1])
+    run_start = numpy.flatnonzero(change)
+    run_size = numpy.diff(numpy.append(run_start, len(v)))
+    rank = numpy.arange(len(v)) - start[c] + 1.0
+    run_rank = numpy.add.reduceat(rank, run_start) / run_size
+    rank = numpy.repeat(run_rank, run_size)
+
+    R_a = numpy.bincount(c, weights=rank * f, minlength=G)
+    U = R_a - n_a * (n_a + 1) / 2
+    ties = numpy.bincount(c[run_start], weights=run_size**3 - run_size, minlength=G)
+
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        mean = n_a * n_b / 2
+        var = n_a * n_b / 12 * ((n + 1) - ties / (n * (n - 1)))
+        z = (numpy.abs(U - mean) - 0.5) / numpy.sqrt(var)
+        p = numpy.minimum(2 * norm.sf(numpy.maximum(z, 0)), 1.0)
+
+    return pandas.DataFrame({"n_a": n_a.astype(int), "n_b": n_b.astype(int), "U": U, "p": p},
+                            index=pandas.Index(uniques, name="group"))
+
+def hodges_lehmann(groups_a, a, groups_b, b, max_pairs=2**22, seed=None):
+    """Hodges-Lehmann estimate of the shift between 'a' and 'b' for every group, i.e.
+    the median of all the pairwise differences a_i - b_j.
+
+    The samples of each group are padded into a (groups x n_a x n_b) matrix of
+    differences. When it would exceed 'max_pairs' elements, the samples are randomly
+    subsampled to fit. Returns a Series indexed by group."""
+    rng = numpy.random.default_rng(seed)
+    sa = pandas.Series(a, dtype=numpy.float64).groupby(numpy.asarray(groups_a))
+    sb = pandas.Series(b, dtype=numpy.float64).groupby(numpy.asarray(groups_b))
+    keys = sorted(set(sa.groups) & set(sb.groups))
+    xs = [sa.get_group(k).to_numpy() for k in keys]
+    ys = [sb.get_group(k).to_numpy() for k in keys]
+
+    def pad(samples):
+        width = max(len(s) for s in samples)
+        limit = max(int(numpy.sqrt(max_pairs / len(samples))), 1)
+        if width > limit:
+            samples = [rng.choice(s, limit, replace=False) if len(s) > limit else s
+                       for s in samples]
+            width = limit
+        out = numpy.full((len(samples), width), numpy.nan)
+        for i, s in enumerate(samples):
+            out[i, :len(s)] = s
+        return out
+
+    if not keys:
+        return pandas.Series(dtype=numpy.float64, name="shift")
+    X, Y = pad(xs), pad(ys)
+    diff = X[:, :, None] - Y[:, None, :]
+    shift = numpy.nanmedian(diff.reshape(len(keys), -1), axis=1)
+    return pandas.Series(shift, index=pandas.Index(keys, name="group"), name="shift")